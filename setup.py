@@ -9,6 +9,7 @@ setup(
         "label-studio-sdk>=0.0.23",
         "numpy>=1.21.0",
         "Pillow>=8.0.0",
+        "orjson>=3.6.0",
     ],
     author="Your Name",
     author_email="your.email@example.com",
@@ -1,4 +1,4 @@
-from .client import LabelStudioClient
+from .client import LabelStudioClient, get_client
 from .processor import AnnotationProcessor
 
-__all__ = ['LabelStudioClient', 'AnnotationProcessor'] 
\ No newline at end of file
+__all__ = ['LabelStudioClient', 'get_client', 'AnnotationProcessor'] 
@@ -0,0 +1,258 @@
+"""Local disk cache for Label Studio project exports."""
+
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import tempfile
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "label-studio-processor")
+
+# Cache entries are {"metadata": {...}, "data": <export>}; the metadata is ASCII JSON
+_DATA_PREFIX = re.compile(r'\s*\{\s*"metadata"\s*:\s*')
+_DATA_KEY = re.compile(r'\s*,\s*"data"\s*:\s*')
+
+def _cache_path(project_id, updated_at, cache_dir=None, key=None):
+    """Build the cache file path for a project snapshot.
+
+    Args:
+        project_id (int): Project ID in Label Studio
+        updated_at (str): Project last-modified timestamp
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        key (dict, optional): Extra JSON-serializable values the snapshot
+            depends on, such as the server URL and annotation counters
+
+    Returns:
+        str: Path to the compressed cache file
+    """
+    stamp = re.sub(r'[^0-9A-Za-z]+', '-', str(updated_at)).strip('-')
+    if key:
+        digest = hashlib.blake2b(json.dumps(key, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+        stamp = f"{stamp}-{digest}"
+    return os.path.join(cache_dir or CACHE_DIR, f"{project_id}-{stamp}.json.gz")
+
+def _prune_snapshots(project_id, keep_path):
+    """Remove older cached snapshots of a project, keeping only keep_path.
+
+    Args:
+        project_id (int): Project ID in Label Studio
+        keep_path (str): Cache file that was just committed
+    """
+    cache_dir = os.path.dirname(keep_path)
+    pattern = os.path.join(glob.escape(cache_dir), f"{glob.escape(str(project_id))}-*.json.gz")
+    for path in glob.glob(pattern):
+        if path == keep_path:
+            continue
+        try:
+            os.remove(path)
+            logger.debug(f"Removed stale export cache: {path}")
+        except OSError:
+            pass
+
+def _temp_path(path):
+    """Create a unique temporary file next to path for an atomic replace."""
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp',
+                                    dir=os.path.dirname(path))
+    os.close(fd)
+    return tmp_path
+
+def get_cached_export(project_id, updated_at, cache_dir=None, key=None):
+    """Load a cached export for a project if one exists for this timestamp and key.
+
+    Args:
+        project_id (int): Project ID in Label Studio
+        updated_at (str): Project last-modified timestamp
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        key (dict, optional): Extra values the snapshot depends on
+
+    Returns:
+        The cached export payload, or None on a cache miss
+    """
+    if not updated_at:
+        return None
+
+    path = _cache_path(project_id, updated_at, cache_dir, key)
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError):
+        logger.warning(f"Ignoring corrupt export cache: {path}")
+        return None
+
+    logger.info(f"Using cached export for project {project_id} ({path})")
+    return entry['data']
+
+def iter_cached_export(project_id, updated_at, cache_dir=None, key=None, chunk_size=1 << 20):
+    """Open a cached export for streaming instead of loading it whole.
+
+    Args:
+        project_id (int): Project ID in Label Studio
+        updated_at (str): Project last-modified timestamp
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        key (dict, optional): Extra values the snapshot depends on
+        chunk_size (int, optional): Size of the decompressed chunks
+
+    Returns:
+        iterator: The cached export payload as raw JSON byte chunks, or None
+            on a cache miss
+    """
+    if not updated_at:
+        return None
+
+    path = _cache_path(project_id, updated_at, cache_dir, key)
+    try:
+        f = gzip.open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    # Skip past the metadata, reading more until it is complete; latin-1
+    # keeps string offsets equal to byte offsets
+    head = b''
+    start = None
+    try:
+        while start is None:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            head += chunk
+            start = _data_offset(head.decode('latin-1'))
+    except OSError:
+        start = None
+    if start is None:
+        f.close()
+        logger.warning(f"Ignoring corrupt export cache: {path}")
+        return None
+
+    logger.info(f"Streaming cached export for project {project_id} ({path})")
+    return _iter_data_chunks(f, head[start:], chunk_size)
+
+def _data_offset(text):
+    """Find where the data field starts in the head of a cache entry.
+
+    Returns:
+        int: Offset of the data value, or None if the head is incomplete or
+            not a cache entry
+    """
+    match = _DATA_PREFIX.match(text)
+    if match is None:
+        return None
+    try:
+        _, end = json.JSONDecoder().raw_decode(text, match.end())
+    except json.JSONDecodeError:
+        return None
+    match = _DATA_KEY.match(text, end)
+    # The data value must have started, or a key match could still be partial
+    if match is None or match.end() == len(text):
+        return None
+    return match.end()
+
+def _iter_data_chunks(f, first, chunk_size):
+    """Yield the rest of a cache entry, without the closing brace of the entry."""
+    with f:
+        pending = first
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield pending
+            pending = chunk
+        yield pending.rstrip()[:-1]
+
+def put_cached_export(project_id, updated_at, data, cache_dir=None, metadata=None, key=None):
+    """Store an export payload in the cache.
+
+    Args:
+        project_id (int): Project ID in Label Studio
+        updated_at (str): Project last-modified timestamp
+        data: JSON-serializable export payload
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        metadata (dict, optional): Extra metadata stored with the payload
+        key (dict, optional): Extra values the snapshot depends on
+
+    Returns:
+        str: Path to the written cache file, or None if not cached
+    """
+    if not updated_at:
+        return None
+
+    path = _cache_path(project_id, updated_at, cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    entry = {
+        'metadata': {
+            'project_id': project_id,
+            'updated_at': updated_at,
+            'cached_at': time.time(),
+            'key': key,
+            **(metadata or {})
+        },
+        'data': data
+    }
+
+    # Write to a temporary file first so readers never see a partial cache
+    tmp_path = _temp_path(path)
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _prune_snapshots(project_id, path)
+    return path
+
+def cache_export_stream(project_id, updated_at, chunks, cache_dir=None, metadata=None, key=None):
+    """Store a streamed JSON export body in the cache while passing it through.
+
+    The cache entry is only committed once the whole body has been consumed,
+    so an interrupted stream never leaves a partial cache behind.
+
+    Args:
+        project_id (int): Project ID in Label Studio
+        updated_at (str): Project last-modified timestamp
+        chunks (iterable): Raw JSON body as byte chunks
+        cache_dir (str, optional): Cache directory. Defaults to CACHE_DIR.
+        metadata (dict, optional): Extra metadata stored with the payload
+        key (dict, optional): Extra values the snapshot depends on
+
+    Yields:
+        bytes: The chunks, unchanged
+    """
+    if not updated_at:
+        yield from chunks
+        return
+
+    path = _cache_path(project_id, updated_at, cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    header = json.dumps({
+        'project_id': project_id,
+        'updated_at': updated_at,
+        'cached_at': time.time(),
+        'key': key,
+        **(metadata or {})
+    })
+
+    tmp_path = _temp_path(path)
+    committed = False
+    try:
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(f'{{"metadata": {header}, "data": '.encode('utf-8'))
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+            f.write(b'}')
+        os.replace(tmp_path, path)
+        committed = True
+    finally:
+        if not committed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _prune_snapshots(project_id, path)
@@ -1,6 +1,90 @@
 from label_studio_sdk import Client
+import codecs
+import functools
+import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
+from .cache import get_cached_export, put_cached_export, iter_cached_export, cache_export_stream
+
+# Project counters included in the export cache key. A project's updated_at
+# does not necessarily change when its tasks or annotations do.
+EXPORT_CACHE_COUNTERS = ('task_number', 'num_tasks_with_annotations', 'total_annotations_number')
+
+def create_session(api_key=None, pool_connections=16, pool_maxsize=32):
+    """Create a pooled HTTP session for talking to Label Studio.
+    
+    Connections are kept alive and reused across requests, and transient
+    gateway errors (502/503/504) are retried with a short backoff.
+    
+    Args:
+        api_key (str, optional): API key added as the Authorization header
+        pool_connections (int): Number of host connection pools to cache
+        pool_maxsize (int): Maximum number of connections kept per pool
+        
+    Returns:
+        requests.Session: Configured session
+    """
+    session = requests.Session()
+    if api_key:
+        session.headers['Authorization'] = f'Token {api_key}'
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def iter_json_array(chunks):
+    """Incrementally decode the items of a top-level JSON array.
+    
+    Only one item (plus at most one chunk of look-ahead) is held in memory,
+    so very large exports can be processed while they are still downloading.
+    
+    Args:
+        chunks (iterable): Raw JSON body as byte chunks
+        
+    Yields:
+        Each decoded array item, in order
+        
+    Raises:
+        ValueError: If the body is not a JSON array or ends early
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    opened = False
+    for chunk in chunks:
+        buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            # Skip whitespace and the separators between items
+            while pos < len(buf) and buf[pos] in ' \t\n\r,':
+                pos += 1
+            if pos == len(buf):
+                break
+            if not opened:
+                if buf[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                opened = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # Item is incomplete; wait for more data
+            if end == len(buf):
+                break  # A trailing number may continue in the next chunk
+            yield item
+            pos = end
+    raise ValueError("Truncated JSON array")
 
 class LabelStudioClient:
     def __init__(self, url="http://localhost:8080", api_key=None):
@@ -15,9 +99,12 @@ class LabelStudioClient:
             
         self.url = url.rstrip('/')
         self.api_key = api_key
-        self.headers = {
-            'Authorization': f'Token {self.api_key}'
-        }
+        self.session = create_session(api_key)
+        self._verified = False
+        
+        # Validators and bodies for conditional GETs, keyed by URL
+        self._validators = {}
+        self._body_cache = {}
         self.client = Client(url=url, api_key=api_key)
         
         # Verify connection
@@ -30,8 +117,11 @@ class LabelStudioClient:
             ConnectionError: If connection fails
             AuthenticationError: If API key is invalid
         """
+        if self._verified:
+            return
+        
         try:
-            response = requests.get(f"{self.url}/api/projects/", headers=self.headers)
+            response = self.session.get(f"{self.url}/api/projects/")
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             if response.status_code == 401:
@@ -40,20 +130,47 @@ class LabelStudioClient:
                 raise ConnectionError(f"Could not connect to Label Studio at {self.url}")
             else:
                 raise ConnectionError(f"Error connecting to Label Studio: {str(e)}")
+        self._verified = True
     
-    def get_projects(self):
-        """Get all projects from Label Studio.
+    def _get_json_cached(self, url):
+        """GET a JSON resource, revalidating a cached copy with the server.
         
+        Sends If-None-Match/If-Modified-Since for URLs fetched before, so an
+        unchanged resource costs a bodyless 304 response.
+        
+        Args:
+            url (str): Resource URL
+            
         Returns:
-            list: List of projects
+            Decoded JSON body
         """
-        response = requests.get(f"{self.url}/api/projects/", headers=self.headers)
+        headers = {}
+        validators = self._validators.get(url, {})
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 304 and url in self._body_cache:
+            return self._body_cache[url]
         response.raise_for_status()
         data = response.json()
         
-        # Debug the response
-        print("DEBUG - API Response:", data)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._validators[url] = {'etag': etag, 'last_modified': last_modified}
+            self._body_cache[url] = data
+        return data
+    
+    def get_projects(self):
+        """Get all projects from Label Studio.
         
+        Returns:
+            list: List of projects
+        """
+        data = self._get_json_cached(f"{self.url}/api/projects/")
         return data.get('results', [])
 
     def get_project(self, project_id):
@@ -65,9 +182,7 @@ class LabelStudioClient:
         Returns:
             Project object
         """
-        response = requests.get(f"{self.url}/api/projects/{project_id}/", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+        return self._get_json_cached(f"{self.url}/api/projects/{project_id}/")
     
     def get_annotations(self, project_id):
         """Get all annotations for a project.
@@ -79,30 +194,22 @@ class LabelStudioClient:
             List of annotations
         """
         # Get tasks with annotations for the project
-        response = requests.get(
+        response = self.session.get(
             f"{self.url}/api/tasks",
             params={
                 'project': project_id,
                 'with_annotations': True
-            },
-            headers=self.headers
+            }
         )
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
-        # Extract annotations from tasks
-        annotations = []
-        for task in data:
-            if task.get('annotations'):
-                for annotation in task['annotations']:
-                    # Include task data with each annotation
-                    annotation['task'] = {
-                        'id': task['id'],
-                        'data': task['data']
-                    }
-                    annotations.append(annotation)
-        
-        return annotations
+        # Extract annotations from tasks, including task data with each one
+        return [
+            {**annotation, 'task': {'id': task['id'], 'data': task['data']}}
+            for task in data
+            for annotation in task.get('annotations') or ()
+        ]
 
     def create_project(self, title, description, label_config):
         """Create a new Label Studio project.
@@ -115,9 +222,8 @@ class LabelStudioClient:
         Returns:
             int: Created project ID
         """
-        response = requests.post(
+        response = self.session.post(
             f"{self.url}/api/projects/",
-            headers=self.headers,
             json={
                 "title": title,
                 "description": description,
@@ -137,75 +243,201 @@ class LabelStudioClient:
         Returns:
             dict: Import result
         """
-        response = requests.post(
+        response = self.session.post(
             f"{self.url}/api/projects/{project_id}/import",
-            headers=self.headers,
             json=tasks
         )
         response.raise_for_status()
         return response.json()
 
-    def export_annotations(self, project_id, export_format='JSON'):
+    def export_annotations(self, project_id, export_format='JSON', max_wait=600, use_cache=False,
+                           dest_path=None, include_resources=False):
         """Export annotations from a project.
         
+        With use_cache=True, JSON exports are cached on disk keyed by the
+        server URL and the project's ``updated_at`` timestamp and
+        task/annotation counters, so re-exporting an unchanged project skips
+        the API. Only the latest snapshot of each project is kept.
+        
+        By default only annotations are exported. Asking the server to bundle
+        the task images as well (include_resources=True) is much slower and
+        is the usual cause of export timeouts on large projects.
+        
         Args:
             project_id (int): Project ID in Label Studio
             export_format (str): Format to export (JSON, CSV, COCO, etc.)
+            max_wait (float): Maximum seconds to wait for a snapshot export
+            use_cache (bool): Whether to read/write the local export cache.
+                Off by default, since exports can hold sensitive data.
+            dest_path (str, optional): If given, stream the export body to this
+                file instead of holding it in memory
+            include_resources (bool): Whether the server should package the
+                task images into the export
             
         Returns:
-            List of annotations in the specified format
+            List of annotations in the specified format, or dest_path if given
+            
+        Raises:
+            TimeoutError: If the snapshot is not ready within max_wait seconds
+        """
+        if dest_path:
+            return self._export_annotations(project_id, export_format, max_wait,
+                                            dest_path, include_resources)
+        
+        updated_at = None
+        if use_cache and export_format.upper() == 'JSON':
+            updated_at, cache_key = self._export_cache_key(project_id)
+            cached = get_cached_export(project_id, updated_at, key=cache_key)
+            if cached is not None:
+                return cached
+        
+        data = self._export_annotations(project_id, export_format, max_wait,
+                                        include_resources=include_resources)
+        
+        if updated_at:
+            put_cached_export(project_id, updated_at, data, metadata={
+                'url': self.url,
+                'export_format': export_format
+            }, key=cache_key)
+        return data
+    
+    def stream_annotations(self, project_id, max_wait=600, use_cache=False):
+        """Stream a project's JSON export one task at a time.
+        
+        Unlike export_annotations, the export is never held in memory as a
+        whole: tasks are yielded as soon as they are parsed from the response.
+        With use_cache=True, the body is written to the export cache as it
+        streams past, and a cached export is streamed from disk the same way.
+        
+        Args:
+            project_id (int): Project ID in Label Studio
+            max_wait (float): Maximum seconds to wait for a snapshot export
+            use_cache (bool): Whether to read/write the local export cache
+            
+        Yields:
+            dict: Exported tasks
         """
+        updated_at = None
+        cache_key = None
+        if use_cache:
+            updated_at, cache_key = self._export_cache_key(project_id)
+            cached = iter_cached_export(project_id, updated_at, key=cache_key)
+            if cached is not None:
+                yield from iter_json_array(cached)
+                return
+        
+        with self._open_export(project_id, 'JSON', max_wait) as response:
+            chunks = response.iter_content(chunk_size=1 << 20)
+            chunks = cache_export_stream(project_id, updated_at, chunks, metadata={
+                'url': self.url,
+                'export_format': 'JSON'
+            }, key=cache_key)
+            yield from iter_json_array(chunks)
+            
+            # Drain anything after the closing bracket so the cache entry is committed
+            for _ in chunks:
+                pass
+    
+    def _export_cache_key(self, project_id):
+        """Look up what a cached export of a project must match.
+        
+        Args:
+            project_id (int): Project ID in Label Studio
+            
+        Returns:
+            tuple: (updated_at, key) where key holds the server URL and the
+                project's task and annotation counters
+        """
+        project = self.get_project(project_id)
+        key = {'url': self.url, **{name: project.get(name) for name in EXPORT_CACHE_COUNTERS}}
+        return project.get('updated_at'), key
+    
+    def _read_export(self, response, export_format, dest_path=None):
+        """Read an export response body, streaming it to disk if requested."""
+        if dest_path:
+            with open(dest_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+            return dest_path
+        if export_format.upper() == 'JSON':
+            return orjson.loads(response.content)
+        return response.content
+    
+    def _export_annotations(self, project_id, export_format, max_wait, dest_path=None,
+                            include_resources=False):
+        """Fetch an export from the API, falling back to the snapshot API."""
+        response = self._open_export(project_id, export_format, max_wait, include_resources)
+        return self._read_export(response, export_format, dest_path)
+    
+    def _open_export(self, project_id, export_format, max_wait, include_resources=False):
+        """Open a streaming export response, falling back to the snapshot API."""
         # First try the easy export API
-        response = requests.get(
+        response = self.session.get(
             f"{self.url}/api/projects/{project_id}/export",
             params={
                 'exportType': export_format,
-                'download_all_tasks': True  # Include tasks without annotations
+                'download_all_tasks': True,  # Include tasks without annotations
+                'download_resources': int(include_resources)
             },
-            headers=self.headers
+            stream=True
         )
         
         if response.status_code == 200:
-            if export_format.upper() == 'JSON':
-                return response.json()
-            return response.content
+            return response
+        response.close()
             
         # If easy export fails (timeout), use snapshot API
         # 1. Create snapshot
-        snapshot_response = requests.post(
-            f"{self.url}/api/projects/{project_id}/exports",
-            headers=self.headers
+        snapshot_response = self.session.post(
+            f"{self.url}/api/projects/{project_id}/exports"
         )
         snapshot_response.raise_for_status()
         snapshot = snapshot_response.json()
         
-        # 2. Wait for snapshot to be ready
+        # 2. Wait for snapshot to be ready, backing off exponentially
         export_pk = snapshot['id']
+        status_url = f"{self.url}/api/projects/{project_id}/exports/{export_pk}"
+        delay = 0.25
+        deadline = time.monotonic() + max_wait
         while True:
-            status_response = requests.get(
-                f"{self.url}/api/projects/{project_id}/exports/{export_pk}",
-                headers=self.headers
-            )
+            status_response = self.session.get(status_url)
             status_response.raise_for_status()
-            status = status_response.json()
+            status = status_response.json()['status']
             
-            if status['status'] == 'completed':
+            if status == 'completed':
                 break
-            elif status['status'] == 'failed':
+            elif status == 'failed':
                 raise Exception("Export failed")
             
-            time.sleep(1)  # Wait before checking again
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"Export {export_pk} not ready after {max_wait} seconds")
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
             
         # 3. Download the export
-        download_response = requests.get(
-            f"{self.url}/api/projects/{project_id}/exports/{export_pk}/download",
-            headers=self.headers
+        download_response = self.session.get(
+            f"{status_url}/download",
+            params={'exportType': export_format},
+            stream=True
         )
         download_response.raise_for_status()
+        return download_response
+
+@functools.lru_cache(maxsize=4)
+def get_client(url="http://localhost:8080", api_key=None):
+    """Get a shared LabelStudioClient for a URL and API key.
+    
+    Clients are cached, so repeated calls in the same process reuse one
+    verified connection and its session pool.
+    
+    Args:
+        url (str): URL of the Label Studio instance
+        api_key (str): API key for authentication
         
-        if export_format.upper() == 'JSON':
-            return download_response.json()
-        return download_response.content
+    Returns:
+        LabelStudioClient: Connected client
+    """
+    return LabelStudioClient(url=url, api_key=api_key)
 
 class AuthenticationError(Exception):
     pass
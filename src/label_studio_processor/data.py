@@ -1,22 +1,134 @@
 """Functions for preparing and processing Label Studio data."""
 
 import os
-import json
 import logging
-import matplotlib.pyplot as plt
+import pickle
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from .utils import prepare_training_data
+from PIL import Image, ImageDraw
+from .utils import prepare_training_data, get_image
 
 logger = logging.getLogger(__name__)
 
-def load_label_studio_data(exported_data_dir):
+def _load_annotation_file(annotation_path, image_file, image_size=None):
+    """Load a single annotation file, returning None if it cannot be read.
+    
+    Args:
+        annotation_path (str): Path to the annotation JSON file
+        image_file (str): Image filename to record as the task's file_upload
+        image_size (tuple, optional): (width, height) cached in the mapping file
+        
+    Returns:
+        dict: Task data, or None if the file is missing or invalid
+    """
+    try:
+        with open(annotation_path, 'rb') as f:
+            task_data = orjson.loads(f.read())
+    except FileNotFoundError:
+        logger.warning(f"Annotation file not found: {annotation_path}")
+        return None
+    except orjson.JSONDecodeError:
+        logger.warning(f"Invalid annotation file: {annotation_path}")
+        return None
+    
+    # Add file_upload info from mapping
+    task_data['file_upload'] = image_file
+    if image_size:
+        task_data['image_size'] = image_size
+    return task_data
+
+ANNOTATIONS_JSONL = "annotations.jsonl"
+
+def _load_annotations_jsonl(jsonl_path):
+    """Load every task of a combined annotations.jsonl, keyed by task ID.
+    
+    Args:
+        jsonl_path (str): Path to the annotations.jsonl file
+        
+    Returns:
+        dict: Mapping from task ID (str) to task data
+    """
+    tasks = {}
+    try:
+        with open(jsonl_path, 'rb') as f:
+            for line in f:
+                task_data = orjson.loads(line)
+                tasks[str(task_data['id'])] = task_data
+    except FileNotFoundError:
+        logger.warning(f"Annotation file not found: {jsonl_path}")
+    except orjson.JSONDecodeError:
+        logger.warning(f"Invalid annotation file: {jsonl_path}")
+    return tasks
+
+TASKS_CACHE_FILE = "_tasks.pkl"
+
+def _latest_source_mtime(mapping_path, annotations_dir):
+    """Latest modification time of the files the parsed tasks come from.
+    
+    Args:
+        mapping_path (str): Path to the mapping file
+        annotations_dir (str): Directory with the annotation files
+        
+    Returns:
+        int: Latest mtime in nanoseconds of the mapping file, the annotations
+            directory and every file in it
+    """
+    latest = max(os.stat(mapping_path).st_mtime_ns, os.stat(annotations_dir).st_mtime_ns)
+    with os.scandir(annotations_dir) as entries:
+        for entry in entries:
+            latest = max(latest, entry.stat().st_mtime_ns)
+    return latest
+
+def _load_tasks_cache(cache_path, mapping_path, annotations_dir):
+    """Load parsed tasks from the pickle side-car if it is newer than its sources.
+    
+    Args:
+        cache_path (str): Path to the pickle side-car
+        mapping_path (str): Path to the mapping file
+        annotations_dir (str): Directory with the annotation files
+        
+    Returns:
+        list: Cached task data, or None if missing or stale
+    """
+    try:
+        # Stale once the mapping, or any annotation file, is as new as the cache
+        if os.stat(cache_path).st_mtime_ns <= _latest_source_mtime(mapping_path, annotations_dir):
+            return None
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def _save_tasks_cache(cache_path, label_data):
+    """Write parsed tasks to the pickle side-car.
+    
+    Args:
+        cache_path (str): Path to the pickle side-car
+        label_data (list): Parsed task data
+    """
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(label_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write tasks cache {cache_path}: {str(e)}")
+
+def load_label_studio_data(exported_data_dir, use_cache=False):
     """Load Label Studio exported data from directory.
     
     Args:
         exported_data_dir (str): Path to the exported data directory containing:
-            - annotations/: Directory with annotation JSON files
+            - annotations/: Directory with annotation JSON files, or a
+              single annotations.jsonl
             - images/: Directory with image files
             - image_annotation_pairs.json: Mapping file
+        use_cache (bool, optional): Reuse the parsed tasks from a previous run,
+            stored in _tasks.pkl next to the mapping file. The cache is ignored
+            once the mapping file or any annotation file is newer. The cache is
+            a pickle, so only enable this for export directories you created
+            yourself. Defaults to False.
             
     Returns:
         tuple: (label_data, images_dir) where:
@@ -33,47 +145,76 @@ def load_label_studio_data(exported_data_dir):
     if not os.path.exists(images_dir):
         raise FileNotFoundError(f"Images directory not found: {images_dir}")
     
+    # Reuse parsed tasks from a previous run if the export hasn't changed
+    cache_path = os.path.join(exported_data_dir, TASKS_CACHE_FILE)
+    if use_cache:
+        label_data = _load_tasks_cache(cache_path, mapping_path, annotations_dir)
+        if label_data:
+            logger.info(f"Loaded {len(label_data)} annotation files from {cache_path}")
+            return label_data, images_dir
+    
     # Load mapping file
     try:
-        with open(mapping_path, 'r') as f:
-            mapping = json.load(f)
+        with open(mapping_path, 'rb') as f:
+            mapping = orjson.loads(f.read())
     except FileNotFoundError:
         raise FileNotFoundError(f"Mapping file not found: {mapping_path}")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         raise ValueError(f"Invalid mapping file: {mapping_path}")
     
-    # Load all annotation files
+    # Tasks exported as a single annotations.jsonl are parsed in one pass
+    jsonl_tasks = None
+    if any(info['annotation_file'] == ANNOTATIONS_JSONL for info in mapping.values()):
+        jsonl_tasks = _load_annotations_jsonl(os.path.join(annotations_dir, ANNOTATIONS_JSONL))
+    
     label_data = []
+    jobs = []
     for task_id, info in mapping.items():
-        annotation_file = info['annotation_file']
-        annotation_path = os.path.join(annotations_dir, annotation_file)
-        
-        try:
-            with open(annotation_path, 'r') as f:
-                task_data = json.load(f)
-                # Add file_upload info from mapping
-                task_data['file_upload'] = info['image_file']
-                label_data.append(task_data)
-        except FileNotFoundError:
-            logger.warning(f"Annotation file not found: {annotation_path}")
+        image_size = (info['width'], info['height']) if 'width' in info and 'height' in info else None
+        if info['annotation_file'] != ANNOTATIONS_JSONL:
+            jobs.append((os.path.join(annotations_dir, info['annotation_file']), info['image_file'], image_size))
             continue
-        except json.JSONDecodeError:
-            logger.warning(f"Invalid annotation file: {annotation_path}")
+        task_data = jsonl_tasks.get(task_id)
+        if task_data is None:
+            logger.warning(f"Task {task_id} not found in {ANNOTATIONS_JSONL}")
             continue
+        task_data['file_upload'] = info['image_file']
+        if image_size:
+            task_data['image_size'] = image_size
+        label_data.append(task_data)
+    
+    # Load all per-task annotation files in parallel; reads are I/O bound
+    if jobs:
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            results = executor.map(lambda job: _load_annotation_file(*job), jobs)
+            label_data.extend(task_data for task_data in results if task_data is not None)
     
     if not label_data:
         raise ValueError("No valid annotation files found!")
+    
+    if use_cache:
+        _save_tasks_cache(cache_path, label_data)
         
     logger.info(f"Loaded {len(label_data)} annotation files")
     return label_data, images_dir
 
+def _mask_area(mask):
+    """Count the set pixels of a mask, which may be packed as (packed, width)."""
+    if isinstance(mask, tuple):
+        # packbits pads rows with zero bits, so they never add to the count
+        return int(np.count_nonzero(np.unpackbits(mask[0])))
+    return int(np.count_nonzero(mask))
+
 def get_dataset_statistics(data):
     """Calculate statistics for the prepared dataset.
     
     Args:
         data (dict): Dictionary containing:
             - images: Dict mapping image IDs to PIL Images
-            - masks: Dict mapping image IDs to binary masks
+            - masks: Dict mapping image IDs to binary masks, or to
+              (packed, width) tuples from prepare_training_data(pack_masks=True)
+            - mask_areas (optional): Dict mapping image IDs to mask areas,
+              from prepare_training_data(keep_masks=False); used instead of masks
             - box_prompts: Dict mapping image IDs to bounding boxes
             
     Returns:
@@ -82,23 +223,31 @@ def get_dataset_statistics(data):
             - avg_mask_area: Average mask area in pixels
             - avg_bbox_area: Average bounding box area in pixels
     """
-    num_samples = len(data['images'])
+    task_ids = data.get('task_ids') or list(data['images'].keys())
+    num_samples = len(task_ids)
     if num_samples == 0:
         return None
-        
-    total_mask_area = 0
-    total_bbox_area = 0
     
-    for task_id in data['images'].keys():
-        mask = data['masks'][task_id]
-        bbox = data['box_prompts'][task_id]
-        
-        # Mask area
-        total_mask_area += np.sum(mask)
-        
-        # Bbox area
-        x_min, y_min, x_max, y_max = bbox
-        total_bbox_area += (x_max - x_min) * (y_max - y_min)
+    if 'mask_areas' in data:
+        total_mask_area = sum(sum(data['mask_areas'][task_id]) for task_id in task_ids)
+    else:
+        # Masks may be a single array or a list of arrays or packed masks per task
+        masks = []
+        for task_id in task_ids:
+            task_masks = data['masks'][task_id]
+            if isinstance(task_masks, (np.ndarray, tuple)):
+                masks.append(task_masks)
+            else:
+                masks.extend(task_masks)
+        mask_areas = np.fromiter(map(_mask_area, masks), dtype=np.int64, count=len(masks))
+        total_mask_area = int(mask_areas.sum())
+    
+    # Boxes are (x_min, y_min, x_max, y_max); reduce them all at once
+    bboxes = np.concatenate([
+        np.asarray(data['box_prompts'][task_id], dtype=np.int64).reshape(-1, 4)
+        for task_id in task_ids
+    ])
+    total_bbox_area = int(((bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])).sum())
     
     return {
         'num_samples': num_samples,
@@ -106,20 +255,80 @@ def get_dataset_statistics(data):
         'avg_bbox_area': total_bbox_area / num_samples
     }
 
-def visualize_sample(image, mask, bbox, output_path):
+def visualize_sample_pil(image, mask, bbox, output_path):
+    """Save the image with its mask overlay and bounding box using Pillow.
+    
+    Args:
+        image (PIL.Image): Original image
+        mask (numpy.ndarray or list): Binary mask, or a list of masks
+        bbox (list): Bounding box [x_min, y_min, x_max, y_max], or a list of them
+        output_path (str): Path to save the visualization
+    """
+    masks = mask if isinstance(mask, (list, tuple)) else [mask]
+    bboxes = np.asarray(bbox).reshape(-1, 4)
+    
+    # Red overlay with 0.3 alpha wherever any mask is set
+    overlay = np.zeros((*masks[0].shape, 4), dtype=np.uint8)
+    for m in masks:
+        overlay[m > 0] = (255, 0, 0, 77)
+    
+    out = Image.alpha_composite(image.convert('RGBA'), Image.fromarray(overlay, 'RGBA'))
+    draw = ImageDraw.Draw(out)
+    for x_min, y_min, x_max, y_max in bboxes.tolist():
+        draw.rectangle((x_min, y_min, x_max, y_max), outline='green', width=2)
+    out.save(output_path)
+
+def _create_figure():
+    """Create a three-panel figure for the matplotlib backend.
+    
+    The figure is built without pyplot, so it always renders with the
+    non-interactive Agg canvas and never loads a GUI toolkit. matplotlib is
+    only imported when this backend is used.
+    
+    Returns:
+        tuple: (figure, axes)
+    """
+    from matplotlib.figure import Figure
+    
+    fig = Figure(figsize=(15, 5))
+    return fig, fig.subplots(1, 3)
+
+def visualize_sample(image, mask, bbox, output_path, axes=None, backend='pil'):
     """Visualize a single sample with its mask and bounding box.
     
     Args:
         image (PIL.Image): Original image
-        mask (numpy.ndarray): Binary mask
-        bbox (list): Bounding box coordinates [x_min, y_min, x_max, y_max]
+        mask (numpy.ndarray or list): Binary mask, or a list of masks
+        bbox (list): Bounding box [x_min, y_min, x_max, y_max], or a list of them
         output_path (str): Path to save the visualization
+        axes (sequence, optional): Three existing axes to draw into. They are
+            cleared and reused, and the figure is left open for the caller.
+            Only used by the matplotlib backend.
+        backend (str): 'pil' saves a single overlay image with Pillow;
+            'matplotlib' renders the three-panel figure. Defaults to 'pil'.
     """
-    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 5))
+    if backend == 'pil':
+        visualize_sample_pil(image, mask, bbox, output_path)
+        return
+    
+    from matplotlib.patches import Rectangle
+    
+    if axes is None:
+        fig, axes = _create_figure()
+    else:
+        fig = axes[0].figure
+        for ax in axes:
+            ax.cla()
+    ax1, ax2, ax3 = axes
     
     # Convert PIL Image to numpy array
     image_np = np.array(image)
     
+    # Tasks may carry several masks and boxes; show them together
+    if isinstance(mask, (list, tuple)):
+        mask = np.any(np.stack(mask), axis=0)
+    bboxes = np.asarray(bbox).reshape(-1, 4)
+    
     # Original image
     ax1.imshow(image_np)
     ax1.set_title('Original Image')
@@ -133,23 +342,23 @@ def visualize_sample(image, mask, bbox, output_path):
     # Image with overlays
     ax3.imshow(image_np)
     # Add semi-transparent mask overlay
-    mask_overlay = np.zeros((*mask.shape, 4))  # RGBA
-    mask_overlay[mask > 0] = [1, 0, 0, 0.3]  # Red with 0.3 alpha
+    mask_overlay = np.zeros((*mask.shape, 4), dtype=np.uint8)  # RGBA
+    mask_overlay[mask > 0] = (255, 0, 0, 77)  # Red with 0.3 alpha
     ax3.imshow(mask_overlay)
     
-    # Add bounding box
-    x_min, y_min, x_max, y_max = bbox
-    rect = plt.Rectangle((x_min, y_min), x_max - x_min, y_max - y_min,
-                        fill=False, color='green', linewidth=2)
-    ax3.add_patch(rect)
+    # Add bounding boxes
+    for x_min, y_min, x_max, y_max in bboxes.tolist():
+        rect = Rectangle((x_min, y_min), x_max - x_min, y_max - y_min,
+                         fill=False, color='green', linewidth=2)
+        ax3.add_patch(rect)
     ax3.set_title('Overlay with Bounding Box')
     ax3.axis('off')
     
-    plt.tight_layout()
-    plt.savefig(output_path)
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_path)
 
-def prepare_and_visualize_data(exported_data_dir, output_dir=None, num_vis_samples=5):
+def prepare_and_visualize_data(exported_data_dir, output_dir=None, num_vis_samples=5, backend='pil',
+                               return_data=True):
     """Prepare training data and generate visualizations.
     
     Args:
@@ -157,6 +366,12 @@ def prepare_and_visualize_data(exported_data_dir, output_dir=None, num_vis_sampl
         output_dir (str, optional): Directory to save visualizations. If None,
             creates 'training_data_visualization' in the workspace root.
         num_vis_samples (int, optional): Number of samples to visualize. Defaults to 5.
+        backend (str, optional): Visualization backend, 'pil' or 'matplotlib'.
+            Defaults to 'pil'.
+        return_data (bool, optional): If False, images are not kept open and
+            masks are reduced to their areas as they are parsed; only the
+            visualized samples are loaded again in full. prepared_data is
+            returned as None. Defaults to True.
         
     Returns:
         tuple: (prepared_data, statistics) where:
@@ -168,7 +383,7 @@ def prepare_and_visualize_data(exported_data_dir, output_dir=None, num_vis_sampl
     
     # Prepare training data
     logger.info(f"Preparing training data from {len(label_data)} annotation files...")
-    data = prepare_training_data(label_data, images_dir)
+    data = prepare_training_data(label_data, images_dir, keep_images=return_data, keep_masks=return_data)
     
     # Calculate statistics
     statistics = get_dataset_statistics(data)
@@ -183,13 +398,25 @@ def prepare_and_visualize_data(exported_data_dir, output_dir=None, num_vis_sampl
         os.makedirs(output_dir, exist_ok=True)
         logger.info("Generating visualizations...")
         
-        for i, (task_id, image) in enumerate(list(data['images'].items())[:num_vis_samples]):
-            mask = data['masks'][task_id]
-            bbox = data['box_prompts'][task_id]
+        # Without the masks, prepare just the visualized tasks again
+        vis_data = data
+        if not return_data:
+            vis_ids = set(data['task_ids'][:num_vis_samples])
+            vis_data = prepare_training_data([task for task in label_data if str(task['id']) in vis_ids],
+                                             images_dir, keep_images=False)
+        
+        # Reuse a single figure for all samples
+        axes = _create_figure()[1] if backend == 'matplotlib' else None
+        for task_id in data['task_ids'][:num_vis_samples]:
+            image = get_image(vis_data, task_id)
+            mask = vis_data['masks'][task_id]
+            bbox = vis_data['box_prompts'][task_id]
             
             output_path = os.path.join(output_dir, f"sample_{task_id}.png")
-            visualize_sample(image, mask, bbox, output_path)
+            visualize_sample(image, mask, bbox, output_path, axes=axes, backend=backend)
             
         logger.info(f"Visualizations saved to {output_dir}")
     
+    if not return_data:
+        return None, statistics
     return data, statistics 
\ No newline at end of file
@@ -1,16 +1,13 @@
-from label_studio_processor import LabelStudioClient
-from label_studio_processor.client import AuthenticationError
+import os
+from label_studio_processor.client import AuthenticationError, get_client
 
 def main():
-    # Replace with your actual API key
-    API_KEY = "db746855c4ae789b7ac4c06acde8c6f482da7c05"
+    # Read the API key from the environment
+    API_KEY = os.environ.get("LS_API_KEY")
     
     try:
         # Initialize client
-        client = LabelStudioClient(
-            url="http://localhost:8080",
-            api_key=API_KEY
-        )
+        client = get_client("http://localhost:8080", API_KEY)
         
         # Get projects
         projects = client.get_projects()
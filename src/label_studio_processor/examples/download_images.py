@@ -1,10 +1,13 @@
-from label_studio_sdk import Client
-from label_studio_processor.client import AuthenticationError
+from label_studio_processor.client import AuthenticationError, create_session, get_client
 import os
-import requests
+import shutil
 import logging
 import json
+import orjson
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, urljoin
+from tqdm import tqdm
 
 def setup_logging():
     logging.basicConfig(
@@ -13,38 +16,49 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-def download_file(url, output_path, headers=None):
-    """Download a file from URL to the specified path."""
-    response = requests.get(url, stream=True, headers=headers)
-    response.raise_for_status()
+def download_file(url, output_path, session):
+    """Download a file from URL to the specified path using a shared session."""
+    with session.get(url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        
+        with open(output_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1 << 20)
+
+def is_up_to_date(entry, updated_at):
+    """Check that a downloaded file exists and is newer than the task.
     
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
+    Args:
+        entry (os.DirEntry): Directory entry for the file, or None if missing
+        updated_at (str): Task last-modified timestamp in ISO format
+    """
+    if entry is None:
+        return False
+    if not updated_at:
+        return True
+    try:
+        task_time = datetime.fromisoformat(updated_at.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return True
+    return entry.stat().st_mtime >= task_time
 
 def main():
     logger = setup_logging()
     
-    # Replace with your actual API key
-    API_KEY = "db746855c4ae789b7ac4c06acde8c6f482da7c05"
+    # Read the API key from the environment
+    API_KEY = os.environ.get("LS_API_KEY")
     PROJECT_ID = 3
     BASE_URL = "http://localhost:8080"
     
     try:
         # Initialize client
         logger.info("Connecting to Label Studio...")
-        ls = Client(
-            url=BASE_URL,
-            api_key=API_KEY
-        )
-        ls.check_connection()
+        client = get_client(BASE_URL, API_KEY)
+        ls = client.client
         logger.info("Successfully connected to Label Studio")
         
-        # Set up headers for authenticated requests
-        headers = {
-            'Authorization': f'Token {API_KEY}'
-        }
+        # Shared pooled session for authenticated downloads
+        session = create_session(API_KEY, pool_connections=32, pool_maxsize=32)
         
         # Get the project
         project = ls.get_project(PROJECT_ID)
@@ -64,7 +78,8 @@ def main():
         # Create a mapping file to track image-annotation pairs
         pairs_mapping = {}
         
-        # Download images and save annotations from each task
+        # Collect download jobs for each task
+        jobs = []
         for task in tasks:
             try:
                 task_id = task['id']
@@ -88,7 +103,6 @@ def main():
                 
                 # Save annotation data
                 annotation_filename = f"task_{task_id}_annotation.json"
-                annotation_output_path = os.path.join(annotations_dir, annotation_filename)
                 
                 # Add to mapping
                 pairs_mapping[task_id] = {
@@ -97,23 +111,47 @@ def main():
                     'original_filename': original_filename
                 }
                 
-                # Download image if it doesn't exist
-                if not os.path.exists(image_output_path):
-                    logger.info(f"Downloading image for task {task_id} to {image_filename}")
-                    download_file(image_url, image_output_path, headers=headers)
-                    logger.info(f"Successfully downloaded: {image_filename}")
-                else:
-                    logger.info(f"Image already exists: {image_output_path}")
-                
-                # Save annotation data
-                with open(annotation_output_path, 'w') as f:
-                    json.dump(task, f, indent=2)
-                logger.info(f"Saved annotation data to: {annotation_filename}")
+                jobs.append((task, image_url, image_output_path))
                 
             except Exception as e:
                 logger.error(f"Error processing task {task.get('id', 'unknown')}: {str(e)}")
                 continue
         
+        # Download images concurrently over the shared session
+        # List existing images once instead of a stat() per task
+        existing = {entry.name: entry for entry in os.scandir(images_dir)}
+        pending = [
+            job for job in jobs
+            if not is_up_to_date(existing.get(os.path.basename(job[2])), job[0].get('updated_at'))
+        ]
+        logger.info(f"Downloading {len(pending)} images ({len(jobs) - len(pending)} already exist)")
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = {
+                executor.submit(download_file, image_url, image_output_path, session): task
+                for task, image_url, image_output_path in pending
+            }
+            
+            # Save annotation data on the main thread while downloads run
+            saved_count = 0
+            for task, _, _ in jobs:
+                try:
+                    annotation_filename = pairs_mapping[task['id']]['annotation_file']
+                    annotation_output_path = os.path.join(annotations_dir, annotation_filename)
+                    with open(annotation_output_path, 'wb') as f:
+                        f.write(orjson.dumps(task, option=orjson.OPT_INDENT_2))
+                    saved_count += 1
+                except Exception as e:
+                    logger.error(f"Error saving annotation for task {task.get('id', 'unknown')}: {str(e)}")
+                    continue
+            logger.info(f"Saved {saved_count} annotation files to: {annotations_dir}")
+            
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading images"):
+                task = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error downloading image for task {task['id']}: {str(e)}")
+        
         # Save the mapping file
         mapping_file = os.path.join(base_output_dir, "image_annotation_pairs.json")
         with open(mapping_file, 'w') as f:
@@ -15,7 +15,7 @@ def main():
     logger = setup_logging()
     
     # Configuration
-    API_KEY = "db746855c4ae789b7ac4c06acde8c6f482da7c05"
+    API_KEY = os.environ.get("LS_API_KEY")
     PROJECT_ID = 3  # Mix beads project
     BASE_URL = "http://localhost:8080"
     
@@ -1,6 +1,10 @@
 import logging
 import os
-from label_studio_processor.export import export_project_data, export_to_yolo
+import argparse
+import requests
+from label_studio_processor.export import (
+    export_project_data, export_to_yolo, export_yolo_from_server, LINK_MODES, LABEL_FORMATS
+)
 
 def setup_logging():
     """Set up logging configuration."""
@@ -11,10 +15,19 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 def main():
+    parser = argparse.ArgumentParser(description="Export a Label Studio project as a YOLO dataset")
+    parser.add_argument("--link-mode", default="hardlink", choices=LINK_MODES,
+                        help="How to place images in the YOLO dataset")
+    parser.add_argument("--label-format", default="txt", choices=LABEL_FORMATS,
+                        help="One .txt per image, or a single labels.jsonl")
+    parser.add_argument("--server-export", action="store_true",
+                        help="Let Label Studio build the YOLO labels (rectangle/polygon projects only)")
+    args = parser.parse_args()
+    
     logger = setup_logging()
     
     # Configuration
-    API_KEY = "db746855c4ae789b7ac4c06acde8c6f482da7c05"
+    API_KEY = os.environ.get("LS_API_KEY")
     PROJECT_ID = 3  # Mix beads project
     BASE_URL = "http://localhost:8080"
     
@@ -25,6 +38,14 @@ def main():
     yolo_dir = os.path.join(data_dir, "example_yolo_dataset")
     os.makedirs(data_dir, exist_ok=True)
     
+    if args.server_export:
+        try:
+            export_yolo_from_server(BASE_URL, API_KEY, PROJECT_ID, yolo_dir)
+            logger.info(f"YOLO dataset saved to: {yolo_dir}")
+            return
+        except requests.HTTPError as e:
+            logger.warning(f"Server-side YOLO export failed ({str(e)}), converting locally")
+    
     try:
         # First export the data from Label Studio
         logger.info("Step 1: Exporting data from Label Studio...")
@@ -39,7 +60,9 @@ def main():
         logger.info("\nStep 2: Converting to YOLO format...")
         successful_count = export_to_yolo(
             exported_data_dir=export_dir,
-            output_dir=yolo_dir
+            output_dir=yolo_dir,
+            link_mode=args.link_mode,
+            label_format=args.label_format
         )
         
         logger.info(f"Successfully converted {successful_count} annotations to YOLO format")
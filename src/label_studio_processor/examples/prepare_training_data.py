@@ -1,9 +1,12 @@
 import logging
 import os
 import json
-import numpy as np
+import shutil
 from PIL import Image
-from label_studio_processor.utils import prepare_training_data, bbox_to_yolo
+from label_studio_processor.utils import (
+    prepare_training_data, bbox_to_yolo_batch, write_yolo_labels, run_parallel, get_image_size
+)
+from label_studio_processor.data import load_label_studio_data
 
 def setup_logging():
     """Set up logging configuration."""
@@ -13,12 +16,56 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+def save_task(task_id, image_path, task_masks, task_boxes, task_classes, images_dir, masks_dir, boxes_dir):
+    """Save the image, masks and YOLO boxes for a single task.
+    
+    Args:
+        task_id (str): Task ID used to name the output files
+        image_path (str): Path to the task image
+        task_masks (list): (packed_rows, width) tuples for the task's masks,
+            as returned by prepare_training_data with pack_masks=True
+        task_boxes (list): Bounding boxes for the task
+        task_classes (list): Class IDs for the task
+        images_dir (str): Directory to save the image
+        masks_dir (str): Directory to save the masks
+        boxes_dir (str): Directory to save the YOLO boxes
+        
+    Returns:
+        int: Number of masks saved
+    """
+    # Save image; PNG sources are copied as is instead of being re-encoded.
+    # Get image dimensions for YOLO format conversion.
+    output_path = os.path.join(images_dir, f"{task_id}.png")
+    if image_path.lower().endswith('.png'):
+        shutil.copyfile(image_path, output_path)
+        img_width, img_height = get_image_size(image_path)
+    else:
+        with Image.open(image_path) as image:
+            image.save(output_path)
+            img_width, img_height = image.size
+    
+    # Save each mask as a separate 1-bit PNG with index; PIL's 1-bit raw layout
+    # matches the packed rows, so the masks are never unpacked
+    for idx, (packed, mask_width) in enumerate(task_masks):
+        mask_filename = f"{task_id}_{idx}.png"
+        mask_img = Image.frombytes('1', (mask_width, packed.shape[0]), packed.tobytes())
+        # Binary masks compress nearly as well at the fastest zlib level
+        mask_img.save(os.path.join(masks_dir, mask_filename), compress_level=1)
+    
+    # Save all bounding boxes in YOLO format in a single file
+    yolo_boxes = bbox_to_yolo_batch(task_boxes, img_width, img_height)
+    write_yolo_labels(os.path.join(boxes_dir, f"{task_id}.txt"), task_classes, yolo_boxes)
+    
+    return len(task_masks)
+
 def save_prepared_data(prepared_data, output_dir):
     """Save the prepared training data to disk.
     Handles multiple masks per image.
     
     Args:
-        prepared_data (dict): Dictionary containing images, masks, box_prompts, class_ids and class_map
+        prepared_data (dict): Dictionary containing image paths, packed masks,
+            box_prompts, class_ids and class_map, as returned by
+            prepare_training_data with keep_images=False and pack_masks=True
         output_dir (str): Directory to save the data
     """
     # Create subdirectories
@@ -29,44 +76,25 @@ def save_prepared_data(prepared_data, output_dir):
     os.makedirs(masks_dir, exist_ok=True)
     os.makedirs(boxes_dir, exist_ok=True)
     
-    total_masks = 0
-    
-    # Save data for each task
-    for task_id in prepared_data['images'].keys():
-        # Save image
-        image = prepared_data['images'][task_id]
-        image.save(os.path.join(images_dir, f"{task_id}.png"))
-        
-        # Get image dimensions for YOLO format conversion
-        img_width, img_height = image.size
-        
-        # Get all masks, boxes, and classes for this task
-        task_masks = prepared_data['masks'][task_id]
-        task_boxes = prepared_data['box_prompts'][task_id]
-        task_classes = prepared_data['class_ids'][task_id]
-        
-        # Save each mask as a separate PNG with index
-        for idx, mask in enumerate(task_masks):
-            mask_filename = f"{task_id}_{idx}.png"
-            mask_img = Image.fromarray((mask * 255).astype(np.uint8))
-            mask_img.save(os.path.join(masks_dir, mask_filename))
-        
-        # Save all bounding boxes in YOLO format in a single file
-        yolo_lines = []
-        for bbox, class_id in zip(task_boxes, task_classes):
-            yolo_bbox = bbox_to_yolo(bbox, img_width, img_height)
-            yolo_lines.append(f"{class_id} {' '.join(f'{x:.6f}' for x in yolo_bbox)}")
-        
-        with open(os.path.join(boxes_dir, f"{task_id}.txt"), 'w') as f:
-            f.write('\n'.join(yolo_lines))
-        
-        total_masks += len(task_masks)
+    # Encode and write each task in parallel; tiny datasets run inline
+    task_ids = prepared_data['task_ids']
+    args_list = [
+        (task_id, image_path, task_masks, task_boxes, task_classes, images_dir, masks_dir, boxes_dir)
+        for task_id, image_path, task_masks, task_boxes, task_classes in zip(
+            task_ids,
+            prepared_data['images'].values(),
+            prepared_data['masks'].values(),
+            prepared_data['box_prompts'].values(),
+            prepared_data['class_ids'].values()
+        )
+    ]
+    total_masks = sum(run_parallel(save_task, args_list))
     
     # Save a summary file with class mapping and statistics
     summary = {
         'num_images': len(prepared_data['images']),
         'total_masks': total_masks,
-        'task_ids': list(prepared_data['images'].keys()),
+        'task_ids': task_ids,
         'class_mapping': prepared_data['class_map']
     }
     with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
@@ -88,47 +116,25 @@ def main():
     export_dir = os.path.join(data_dir, "example_exported_data")
     training_dir = os.path.join(data_dir, "example_training_data")
     
-    # Get subdirectories from export
-    images_dir = os.path.join(export_dir, "images")
-    annotations_dir = os.path.join(export_dir, "annotations")
-    
     # Create output directory
     os.makedirs(training_dir, exist_ok=True)
     
-    # Load mapping file
-    mapping_file = os.path.join(export_dir, "image_annotation_pairs.json")
+    # Load tasks; parsed tasks are cached next to the export so reruns skip JSON parsing
     try:
-        with open(mapping_file, 'r') as f:
-            mapping_data = json.load(f)
-    except FileNotFoundError:
-        logger.error(f"Mapping file not found at: {mapping_file}")
+        tasks, images_dir = load_label_studio_data(export_dir, use_cache=True)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(str(e))
         return
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in mapping file: {mapping_file}")
-        return
-    
-    # Load tasks
-    tasks = []
-    for task_id, task_info in mapping_data.items():
-        annotation_file = os.path.join(annotations_dir, task_info['annotation_file'])
-        try:
-            with open(annotation_file, 'r') as f:
-                task = json.load(f)
-                # Update the file_upload field with the correct image filename from mapping
-                task['file_upload'] = task_info['image_file']
-                tasks.append(task)
-        except FileNotFoundError:
-            logger.warning(f"Annotation file not found: {annotation_file}")
-            continue
-        except json.JSONDecodeError:
-            logger.warning(f"Invalid JSON in annotation file: {annotation_file}")
-            continue
     
     # Prepare training data
     try:
+        # Keep image paths and packed masks only; workers copy the files
+        # instead of receiving pickled images and full-size masks
         prepared_data = prepare_training_data(
             label_json=tasks,
-            images_dir=images_dir
+            images_dir=images_dir,
+            keep_images=False,
+            pack_masks=True
         )
         
         # Save the prepared data
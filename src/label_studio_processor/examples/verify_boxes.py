@@ -1,41 +1,52 @@
 import os
 import random
+import matplotlib
+matplotlib.use("Agg")  # Only PNGs are written; skip loading a GUI backend
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.collections import PatchCollection
 from PIL import Image
 import numpy as np
 
-def plot_yolo_box(ax, box_line, img_width, img_height):
-    """Plot a YOLO format box on the given axis.
+def load_yolo_boxes(box_file):
+    """Load every box of a YOLO label file in one call.
+    
+    Args:
+        box_file (str): Path to a YOLO label file
+        
+    Returns:
+        np.ndarray: (N, 5) array of class, x_center, y_center, width, height
+    """
+    # np.loadtxt warns on empty files, which images without boxes produce
+    if os.path.getsize(box_file) == 0:
+        return np.empty((0, 5))
+    return np.loadtxt(box_file, ndmin=2)
+
+def plot_yolo_boxes(ax, boxes, img_width, img_height, max_labels=20):
+    """Plot all YOLO format boxes of an image on the given axis at once.
     
     Args:
         ax: matplotlib axis
-        box_line (str): YOLO format line "<class> <x_center> <y_center> <width> <height>"
+        boxes (np.ndarray): (N, 5) array of class, x_center, y_center, width, height
         img_width (int): Image width
         img_height (int): Image height
+        max_labels (int): Skip the class labels when there are more boxes than this
     """
-    # Parse YOLO format
-    class_id, x_center, y_center, width, height = map(float, box_line.strip().split())
+    if len(boxes) == 0:
+        return
     
     # Convert normalized coordinates back to pixel coordinates
-    x_center *= img_width
-    y_center *= img_height
-    width *= img_width
-    height *= img_height
-    
-    # Calculate box corners
-    x_min = x_center - width/2
-    y_min = y_center - height/2
+    sizes = boxes[:, 3:5] * (img_width, img_height)
+    corners = boxes[:, 1:3] * (img_width, img_height) - sizes / 2
     
-    # Create rectangle patch
-    rect = patches.Rectangle(
-        (x_min, y_min), width, height,
-        linewidth=2, edgecolor='r', facecolor='none'
-    )
-    ax.add_patch(rect)
+    # Draw every box as one collection
+    rects = [patches.Rectangle((x, y), w, h) for (x, y), (w, h) in zip(corners.tolist(), sizes.tolist())]
+    ax.add_collection(PatchCollection(rects, linewidth=2, edgecolor='r', facecolor='none'))
     
-    # Add class label
-    ax.text(x_min, y_min-5, f'Class {int(class_id)}', color='r')
+    # Add class labels
+    if len(boxes) <= max_labels:
+        for class_id, (x_min, y_min) in zip(boxes[:, 0].astype(int).tolist(), corners.tolist()):
+            ax.text(x_min, y_min-5, f'Class {class_id}', color='r')
 
 def verify_boxes(data_dir, num_samples=5):
     """Verify random samples of bounding boxes.
@@ -54,7 +65,7 @@ def verify_boxes(data_dir, num_samples=5):
     samples = random.sample(image_files, min(num_samples, len(image_files)))
     
     # Create a figure with subplots
-    fig, axes = plt.subplots(1, len(samples), figsize=(5*len(samples), 5))
+    fig, axes = plt.subplots(1, len(samples), figsize=(5*len(samples), 5), constrained_layout=True)
     if len(samples) == 1:
         axes = [axes]
     
@@ -66,27 +77,24 @@ def verify_boxes(data_dir, num_samples=5):
         
         # Load corresponding box file
         box_file = os.path.join(boxes_dir, image_file.replace('.png', '.txt'))
-        with open(box_file, 'r') as f:
-            box_line = f.read().strip()
+        boxes = load_yolo_boxes(box_file)
         
-        # Plot image
-        ax.imshow(image)
+        # Plot image; nearest sampling skips the antialiasing resample pass
+        ax.imshow(image, interpolation='nearest')
         
-        # Plot box
-        plot_yolo_box(ax, box_line, image.width, image.height)
+        # Plot boxes
+        plot_yolo_boxes(ax, boxes, image.width, image.height)
         
         ax.set_title(f'Task {image_file.split(".")[0]}')
         ax.axis('off')
     
-    plt.tight_layout()
-    
     # Create verification directory
     verify_dir = os.path.join(os.path.dirname(data_dir), "example_verification")
     os.makedirs(verify_dir, exist_ok=True)
     
     # Save the plot
-    plt.savefig(os.path.join(verify_dir, "box_verification.png"), dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.savefig(os.path.join(verify_dir, "box_verification.png"), dpi=150)
+    plt.close(fig)
 
 if __name__ == "__main__":
     # Set paths
@@ -1,9 +1,9 @@
 from label_studio_processor.utils import decode_mask, mask_to_bbox
+from label_studio_processor.data import load_label_studio_data
 import os
-import json
-import matplotlib.pyplot as plt
+import functools
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageDraw
 import logging
 
 def setup_logging():
@@ -13,84 +13,82 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=64)
+def _load_image_array(image_path):
+    """Decode an image once; tasks with several annotations reuse the pixels."""
+    return np.asarray(Image.open(image_path).convert('RGB'))
+
 def visualize_mask_and_bbox(image_path, mask, bbox, output_path):
-    """Visualize the image with mask overlay and bounding box."""
-    # Load image
-    img = np.array(Image.open(image_path))
+    """Visualize the image with mask overlay and bounding box.
     
-    # Create figure with subplots
-    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 5))
+    Saves three panels side by side: the original image, the decoded mask and
+    the image with a red mask overlay and green bounding box.
+    """
+    # Load image
+    img = _load_image_array(image_path)
+    height, width = img.shape[:2]
+    selected = mask > 0
     
-    # Original image
-    ax1.imshow(img)
-    ax1.set_title('Original Image')
-    ax1.axis('off')
+    # Write all three panels straight into one canvas
+    canvas = np.empty((height, 3 * width, 3), dtype=np.uint8)
+    canvas[:, :width] = img
     
-    # Mask
-    ax2.imshow(mask, cmap='gray')
-    ax2.set_title('Decoded Mask')
-    ax2.axis('off')
+    # Mask as a grayscale RGB panel
+    canvas[:, width:2 * width] = selected[:, :, None] * np.uint8(255)
     
-    # Image with mask overlay and bbox
-    ax3.imshow(img)
-    # Add semi-transparent mask overlay
-    mask_overlay = np.zeros((*mask.shape, 4))  # RGBA
-    mask_overlay[mask > 0] = [1, 0, 0, 0.3]  # Red with 0.3 alpha
-    ax3.imshow(mask_overlay)
+    # Blend red into masked pixels with 0.3 alpha, in integer arithmetic
+    overlay = canvas[:, 2 * width:]
+    overlay[:] = img
+    blended = (img.astype(np.uint16) * 7 + np.array([765, 0, 0], dtype=np.uint16)) // 10
+    np.copyto(overlay, blended, where=selected[:, :, None], casting='unsafe')
     
-    # Add bounding box
+    # Add bounding box, shifted into the third panel
+    canvas_img = Image.fromarray(canvas)
     x_min, y_min, x_max, y_max = bbox
-    rect = plt.Rectangle((x_min, y_min), x_max - x_min, y_max - y_min,
-                        fill=False, color='green', linewidth=2)
-    ax3.add_patch(rect)
-    ax3.set_title('Overlay with Bounding Box')
-    ax3.axis('off')
-    
-    plt.tight_layout()
-    plt.savefig(output_path)
-    plt.close()
+    ImageDraw.Draw(canvas_img).rectangle(
+        (x_min + 2 * width, y_min, x_max + 2 * width, y_max), outline='green', width=2
+    )
+    # Verification images are throwaway; favour write speed over file size
+    canvas_img.save(output_path, compress_level=1)
 
-def main():
+def main(export_dir=None, verification_dir=None):
+    """Write a verification image for the first brush mask of every task.
+    
+    Args:
+        export_dir (str, optional): Exported data directory. Defaults to
+            data/example_exported_data under the workspace root.
+        verification_dir (str, optional): Output directory. Defaults to
+            data/example_verification under the workspace root.
+    """
     logger = setup_logging()
     
     # Set up directories
     workspace_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
     data_dir = os.path.join(workspace_root, "data")
-    export_dir = os.path.join(data_dir, "example_exported_data")
-    verification_dir = os.path.join(data_dir, "example_verification")
-    
-    # Get subdirectories
-    images_dir = os.path.join(export_dir, "images")
-    annotations_dir = os.path.join(export_dir, "annotations")
+    export_dir = export_dir or os.path.join(data_dir, "example_exported_data")
+    verification_dir = verification_dir or os.path.join(data_dir, "example_verification")
     
     # Create output directory
     os.makedirs(verification_dir, exist_ok=True)
     
-    # Load mapping file
-    mapping_file = os.path.join(export_dir, "image_annotation_pairs.json")
+    # Load tasks; parsed annotations are shared with the other examples via the
+    # export's tasks cache, so a second script run skips JSON parsing
     try:
-        with open(mapping_file, 'r') as f:
-            pairs_mapping = json.load(f)
-    except FileNotFoundError:
-        logger.error(f"Mapping file not found at: {mapping_file}")
-        return
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in mapping file: {mapping_file}")
+        tasks, images_dir = load_label_studio_data(export_dir, use_cache=True)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(str(e))
         return
     
-    logger.info(f"Found {len(pairs_mapping)} image-annotation pairs")
+    logger.info(f"Found {len(tasks)} image-annotation pairs")
+    existing_images = set(os.listdir(images_dir))
     
-    # Process each pair
-    for task_id, pair_info in pairs_mapping.items():
+    # Process each task
+    for task in tasks:
+        task_id = task.get('id', 'unknown')
         try:
-            # Load annotation
-            annotation_path = os.path.join(annotations_dir, pair_info['annotation_file'])
-            with open(annotation_path, 'r') as f:
-                task = json.load(f)
-            
             # Get image path
-            image_path = os.path.join(images_dir, pair_info['image_file'])
-            if not os.path.exists(image_path):
+            image_path = os.path.join(images_dir, task['file_upload'])
+            if task['file_upload'] not in existing_images:
                 logger.warning(f"Image not found: {image_path}")
                 continue
             
@@ -106,6 +104,9 @@ def main():
                         
                         # Get bounding box
                         bbox = mask_to_bbox(mask)
+                        if bbox is None:
+                            logger.warning(f"Empty mask for task {task_id}")
+                            continue
                         
                         # Visualize
                         output_path = os.path.join(verification_dir, f"task_{task_id}_verification.png")
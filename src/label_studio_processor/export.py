@@ -1,51 +1,76 @@
 """Functions for exporting data from Label Studio."""
 
 import os
+import mmap
+import hashlib
 import json
+import orjson
 import logging
-import requests
+import numpy as np
 from urllib.parse import urlparse, urljoin
 from tqdm import tqdm
 import shutil
-from PIL import Image
-from .client import LabelStudioClient
-from .utils import decode_mask, mask_to_bbox, bbox_to_yolo
-from .data import load_label_studio_data
+import queue
+import threading
+import zipfile
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .client import get_client, create_session
+from .utils import rle_to_bbox, bbox_to_yolo_batch, write_yolo_labels, get_image_size, run_parallel
+from .data import load_label_studio_data, ANNOTATIONS_JSONL
 
 logger = logging.getLogger(__name__)
 
-def download_file(url, output_path, headers=None):
+# Shared keep-alive session for downloads that aren't given one
+_session = create_session()
+
+def download_file(url, output_path, headers=None, session=None, show_progress=True, chunk_size=1 << 20):
     """Download a file from URL to the specified path with progress bar.
     
     Args:
         url (str): URL to download from
         output_path (str): Path to save the file
         headers (dict, optional): Headers for the request
+        session (requests.Session, optional): Session to reuse connections from.
+            Defaults to a shared module-level session.
+        show_progress (bool, optional): Show a per-file progress bar. Defaults to True.
+        chunk_size (int, optional): Bytes copied to disk per read. Defaults to 1 MiB.
+    """
+    with (session or _session).get(url, stream=True, headers=headers) as response:
+        response.raise_for_status()
+        
+        # Get file size for progress bar
+        file_size = int(response.headers.get('content-length', 0))
+        
+        # Copy the body to disk in large blocks; tqdm counts bytes as they are read
+        response.raw.decode_content = True
+        with open(output_path, 'wb') as f, tqdm.wrapattr(
+            response.raw,
+            'read',
+            total=file_size,
+            desc=os.path.basename(output_path),
+            leave=False,
+            disable=not show_progress
+        ) as raw:
+            shutil.copyfileobj(raw, f, length=chunk_size)
+
+ANNOTATION_FORMATS = ('per-file', 'jsonl')
+
+def _write_annotation(annotation_path, task):
+    """Write a single task's annotation JSON file.
+    
+    Args:
+        annotation_path (str): Path to write the annotation to
+        task (dict): Task data from the Label Studio export
     """
-    response = requests.get(url, stream=True, headers=headers)
-    response.raise_for_status()
-    
-    # Get file size for progress bar
-    file_size = int(response.headers.get('content-length', 0))
-    
-    # Use tqdm for download progress
-    progress = tqdm(
-        total=file_size,
-        unit='iB',
-        unit_scale=True,
-        desc=os.path.basename(output_path),
-        leave=False
-    )
-    
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                size = len(chunk)
-                f.write(chunk)
-                progress.update(size)
-    progress.close()
+    with open(annotation_path, 'wb') as f:
+        f.write(orjson.dumps(task, option=orjson.OPT_INDENT_2))
 
-def export_project_data(url, api_key, project_id, output_dir):
+def export_project_data(url, api_key, project_id, output_dir, max_workers=16, annotation_format='per-file'):
     """Export all data from a Label Studio project.
     
     Args:
@@ -53,12 +78,20 @@ def export_project_data(url, api_key, project_id, output_dir):
         api_key (str): API key for authentication
         project_id (int): Project ID to export from
         output_dir (str): Directory to save exported data
+        max_workers (int, optional): Number of concurrent image downloads and
+            annotation writes. Defaults to 16.
+        annotation_format (str, optional): 'per-file' writes one JSON file per task;
+            'jsonl' writes all tasks to a single annotations/annotations.jsonl.
+            Both are read by load_label_studio_data. Defaults to 'per-file'.
         
     Returns:
         dict: Mapping between task IDs and their files
     """
+    if annotation_format not in ANNOTATION_FORMATS:
+        raise ValueError(f"Invalid annotation format: {annotation_format}. Expected one of {ANNOTATION_FORMATS}")
+    
     # Initialize client
-    client = LabelStudioClient(url=url, api_key=api_key)
+    client = get_client(url, api_key)
     
     # Create output directories
     images_dir = os.path.join(output_dir, "images")
@@ -66,67 +99,115 @@ def export_project_data(url, api_key, project_id, output_dir):
     os.makedirs(images_dir, exist_ok=True)
     os.makedirs(annotations_dir, exist_ok=True)
     
-    # Set up headers for authenticated requests
-    headers = {'Authorization': f'Token {api_key}'}
-    
-    # Export annotations
+    # Stream annotations; downloads start while the export is still arriving
     logger.info("Exporting annotations...")
-    annotations = client.export_annotations(project_id, export_format='JSON')
-    logger.info(f"Found {len(annotations)} tasks")
+    annotations = tqdm(client.stream_annotations(project_id), desc="Processing tasks", unit="task")
     
     # Create mapping for image-annotation pairs
     pairs_mapping = {}
     
-    # Process each task
-    logger.info("Processing tasks and downloading images...")
-    for task in tqdm(annotations, desc="Processing tasks", unit="task"):
-        try:
-            task_id = str(task['id'])
-            
-            # Get image URL from task data
-            image_path = task['data'].get('image')
-            if not image_path:
-                logger.warning(f"No image URL found in task {task_id}")
-                continue
-            
-            # Combine the base URL with the image path
-            if image_path.startswith('/'):
-                image_url = urljoin(url, image_path)
-            else:
-                image_url = image_path
-            
-            # Generate output filenames
-            original_filename = os.path.basename(urlparse(image_path).path)
-            image_filename = f"task_{task_id}_{original_filename}"
-            annotation_filename = f"task_{task_id}_annotation.json"
-            
-            image_output_path = os.path.join(images_dir, image_filename)
-            annotation_output_path = os.path.join(annotations_dir, annotation_filename)
-            
-            # Add to mapping
-            pairs_mapping[task_id] = {
-                'image_file': image_filename,
-                'annotation_file': annotation_filename,
-                'original_filename': original_filename,
-                'task_id': task_id
-            }
-            
-            # Download image if it doesn't exist
-            if not os.path.exists(image_output_path):
-                download_file(image_url, image_output_path, headers=headers)
+    # List already downloaded images once instead of a stat per task
+    existing_images = set(os.listdir(images_dir))
+    
+    annotations_file = None
+    if annotation_format == 'jsonl':
+        annotations_file = open(os.path.join(annotations_dir, ANNOTATIONS_JSONL), 'wb')
+    
+    # Annotation writes and image downloads share one pool so disk and network I/O overlap
+    write_futures = {}
+    download_futures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Process each task
+            logger.info("Processing tasks...")
+            for task in annotations:
+                try:
+                    task_id = str(task['id'])
+                    
+                    # Get image URL from task data
+                    image_path = task['data'].get('image')
+                    if not image_path:
+                        logger.warning(f"No image URL found in task {task_id}")
+                        continue
+                    
+                    # Combine the base URL with the image path
+                    if image_path.startswith('/'):
+                        image_url = urljoin(url, image_path)
+                    else:
+                        image_url = image_path
+                    
+                    # Generate output filenames
+                    original_filename = os.path.basename(urlparse(image_path).path)
+                    image_filename = f"task_{task_id}_{original_filename}"
+                    if annotations_file is None:
+                        annotation_filename = f"task_{task_id}_annotation.json"
+                    else:
+                        annotation_filename = ANNOTATIONS_JSONL
+                    
+                    image_output_path = os.path.join(images_dir, image_filename)
+                    annotation_output_path = os.path.join(annotations_dir, annotation_filename)
+                    
+                    # Add to mapping
+                    pairs_mapping[task_id] = {
+                        'image_file': image_filename,
+                        'annotation_file': annotation_filename,
+                        'original_filename': original_filename,
+                        'task_id': task_id
+                    }
+                    
+                    # Queue the image download if it doesn't exist
+                    if image_filename not in existing_images:
+                        future = executor.submit(download_file, image_url, image_output_path,
+                                                 session=client.session, show_progress=False)
+                        download_futures[future] = task_id
+                    
+                    # Save annotation data
+                    if annotations_file is None:
+                        write_futures[executor.submit(_write_annotation, annotation_output_path, task)] = task_id
+                    else:
+                        annotations_file.write(orjson.dumps(task, option=orjson.OPT_APPEND_NEWLINE))
+                    
+                except Exception as e:
+                    logger.error(f"Error processing task {task.get('id', 'unknown')}: {str(e)}")
+                    continue
             
-            # Save annotation data
-            with open(annotation_output_path, 'w') as f:
-                json.dump(task, f, indent=2)
+            for future in as_completed(write_futures):
+                task_id = write_futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error saving annotation for task {task_id}: {str(e)}")
+                    pairs_mapping.pop(task_id, None)
             
+            logger.info(f"Found {annotations.n} tasks")
+            if download_futures:
+                logger.info(f"Downloading {len(download_futures)} images...")
+            for future in tqdm(as_completed(download_futures), total=len(download_futures),
+                               desc="Downloading images", unit="image"):
+                task_id = download_futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error downloading image for task {task_id}: {str(e)}")
+                    pairs_mapping.pop(task_id, None)
+    finally:
+        if annotations_file is not None:
+            annotations_file.close()
+    
+    # Cache image dimensions so later steps don't need to open the images
+    for task_id, pair_info in pairs_mapping.items():
+        try:
+            width, height = get_image_size(os.path.join(images_dir, pair_info['image_file']))
         except Exception as e:
-            logger.error(f"Error processing task {task.get('id', 'unknown')}: {str(e)}")
+            logger.warning(f"Could not read image size for task {task_id}: {str(e)}")
             continue
+        pair_info['width'] = width
+        pair_info['height'] = height
     
     # Save the mapping file
     mapping_file = os.path.join(output_dir, "image_annotation_pairs.json")
-    with open(mapping_file, 'w') as f:
-        json.dump(pairs_mapping, f, indent=2, sort_keys=True)
+    with open(mapping_file, 'wb') as f:
+        f.write(orjson.dumps(pairs_mapping, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
     
     logger.info(f"Export complete! Data saved to: {os.path.abspath(output_dir)}")
     logger.info(f"- Images: {images_dir}")
@@ -135,54 +216,297 @@ def export_project_data(url, api_key, project_id, output_dir):
     
     return pairs_mapping
 
-def export_annotations(url, api_key, project_id):
+def export_annotations(url, api_key, project_id, keep_tasks=True):
     """Export and analyze annotations from a Label Studio project.
     
     Args:
         url (str): Label Studio URL
         api_key (str): API key for authentication
         project_id (int): Project ID to export from
+        keep_tasks (bool, optional): Collect the valid tasks. Without them only
+            the counts and one example are kept in memory. Defaults to True.
         
     Returns:
-        tuple: (all_annotations, valid_tasks) where:
-            - all_annotations is the list of all task annotations
-            - valid_tasks is the list of tasks with valid annotations
+        tuple: (total_count, valid_count, valid_tasks, valid_annotation) where:
+            - total_count is the number of exported tasks
+            - valid_count is the number of tasks with valid annotations
+            - valid_tasks is the list of those tasks, or None if keep_tasks is False
+            - valid_annotation is the first valid annotation, or None
     """
     # Initialize client
-    client = LabelStudioClient(url=url, api_key=api_key)
+    client = get_client(url, api_key)
     
-    # Export annotations
+    # Stream annotations so only the valid tasks are kept in memory
     logger.info("Exporting annotations...")
-    annotations = client.export_annotations(project_id, export_format='JSON')
-    
-    logger.info(f"Total tasks: {len(annotations)}")
-    
-    # Count tasks with valid annotations (not cancelled and has results)
-    valid_tasks = [
-        task for task in annotations 
-        if task.get('annotations') and 
-        any(not ann.get('was_cancelled') and ann.get('result') 
-            for ann in task['annotations'])
-    ]
-    
-    logger.info(f"Tasks with valid annotations: {len(valid_tasks)}")
-    
-    if valid_tasks:
+    total_count = 0
+    
+    # Count tasks with valid annotations (not cancelled and has results),
+    # remembering the first valid annotation as an example
+    valid_count = 0
+    valid_tasks = [] if keep_tasks else None
+    valid_annotation = None
+    for task in client.stream_annotations(project_id):
+        total_count += 1
+        for ann in task.get('annotations') or ():
+            if not ann.get('was_cancelled') and ann.get('result'):
+                valid_count += 1
+                if keep_tasks:
+                    valid_tasks.append(task)
+                if valid_annotation is None:
+                    valid_annotation = ann
+                break
+    
+    logger.info(f"Total tasks: {total_count}")
+    logger.info(f"Tasks with valid annotations: {valid_count}")
+    
+    if valid_annotation is not None:
         # Show annotation types from first valid task
-        example_task = valid_tasks[0]
-        valid_annotation = next(
-            ann for ann in example_task['annotations'] 
-            if not ann.get('was_cancelled') and ann.get('result')
-        )
-        
         logger.info("\nAnnotation types:")
         for result in valid_annotation['result']:
             logger.info(f"\n- Type: {result['type']}")
             logger.info(f"  Value: {json.dumps(result['value'], indent=2)}")
     
-    return annotations, valid_tasks 
+    return total_count, valid_count, valid_tasks, valid_annotation
+
+def export_yolo_from_server(url, api_key, project_id, output_dir):
+    """Export a project as a YOLO dataset using Label Studio's own converter.
+    
+    The server builds the labels in one request and images are not bundled, so
+    nothing is re-parsed or rewritten locally. Label Studio's YOLO converter
+    only handles rectangle and polygon labels; brush masks need export_to_yolo.
+    
+    Args:
+        url (str): Label Studio URL
+        api_key (str): API key for authentication
+        project_id (int): Project ID to export from
+        output_dir (str): Directory to extract the YOLO dataset into
+        
+    Returns:
+        str: Path to the output directory
+        
+    Raises:
+        requests.HTTPError: If the server can't produce a YOLO export
+    """
+    client = get_client(url, api_key)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Stream the zip to disk, then unpack it
+    zip_path = os.path.join(output_dir, f"project_{project_id}_yolo.zip")
+    logger.info("Requesting YOLO export from Label Studio...")
+    client.export_annotations(project_id, export_format='YOLO', dest_path=zip_path)
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            zf.extractall(output_dir)
+    finally:
+        os.remove(zip_path)
+    
+    logger.info(f"YOLO export extracted to: {os.path.abspath(output_dir)}")
+    return output_dir
+
+LINK_MODES = ('hardlink', 'symlink', 'copy')
+
+def _content_key(path):
+    """Identify a file by its size and BLAKE2b content hash.
+    
+    Args:
+        path (str): File path
+        
+    Returns:
+        tuple: (size, hex digest)
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return size, ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return size, hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# ioctl request for a copy-on-write clone of a whole file (linux/fs.h)
+FICLONE = 0x40049409
+
+def _reflink(src_path, dst_path):
+    """Clone a file copy-on-write on filesystems that support it (btrfs, XFS).
+    
+    Args:
+        src_path (str): Source file path
+        dst_path (str): Destination file path
+        
+    Returns:
+        bool: True if the clone was made, False if it isn't supported here
+    """
+    if fcntl is None:
+        return False
+    try:
+        with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        return False
+    shutil.copystat(src_path, dst_path)
+    return True
+
+def _is_staged(src_path, dst_path):
+    """Check whether dst_path already holds an up-to-date copy of src_path.
+    
+    Args:
+        src_path (str): Source image path
+        dst_path (str): Existing destination path
+        
+    Returns:
+        bool: True if dst_path is a link to src_path or a copy with matching
+            size and modification time
+    """
+    try:
+        if os.path.samefile(src_path, dst_path):
+            return True
+        src_stat = os.stat(src_path)
+        dst_stat = os.stat(dst_path)
+    except OSError:
+        # Dangling symlink or unreadable destination
+        return False
+    return src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime)
 
-def export_to_yolo(exported_data_dir, output_dir):
+def stage_image(src_path, dst_path, link_mode='hardlink', seen=None):
+    """Place an image into a dataset directory without copying it if possible.
+    
+    Args:
+        src_path (str): Source image path
+        dst_path (str): Destination image path
+        link_mode (str): 'hardlink' links the file and falls back to a symlink
+            across filesystems, 'symlink' always symlinks, 'copy' copies the file
+            (as a copy-on-write reflink where the filesystem supports it).
+            Use 'copy' if images in the dataset will be edited in place.
+            Defaults to 'hardlink'.
+        seen (dict, optional): Content key -> staged path index. In 'copy' mode,
+            images with the same content as one already copied are hardlinked
+            to that copy instead of being copied again.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Invalid link mode: {link_mode}. Expected one of {LINK_MODES}")
+    
+    # Leave current images from a previous run in place, replace stale ones
+    if os.path.lexists(dst_path):
+        if _is_staged(src_path, dst_path):
+            return
+        os.remove(dst_path)
+    
+    if link_mode == 'copy':
+        key = _content_key(src_path) if seen is not None else None
+        if key is not None and key in seen:
+            try:
+                os.link(seen[key], dst_path)
+                return
+            except OSError:
+                pass
+        if not _reflink(src_path, dst_path):
+            shutil.copy2(src_path, dst_path)
+        if key is not None:
+            seen[key] = dst_path
+        return
+    
+    if link_mode == 'hardlink':
+        try:
+            os.link(src_path, dst_path)
+            return
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # Hardlinks can't cross filesystems
+            pass
+    os.symlink(os.path.abspath(src_path), dst_path)
+
+LABEL_FORMATS = ('txt', 'jsonl')
+
+def _write_yolo_files(write_q, link_mode, failures, labels_file=None):
+    """Drain the write queue, staging images and writing label files.
+    
+    Runs in a background thread so disk writes overlap with conversion.
+    
+    Args:
+        write_q (queue.Queue): Queue of (src_image_path, dst_image_path, label_path,
+            class_ids, yolo_boxes) tuples, terminated by None
+        link_mode (str): How to place the image, see stage_image
+        failures (list): Receives the label paths that could not be written
+        labels_file (file, optional): Open binary file; if given, labels are
+            appended to it as JSON lines instead of one .txt file per image
+    """
+    # Only touched from this thread, so no locking is needed
+    seen = {}
+    while True:
+        item = write_q.get()
+        if item is None:
+            break
+        src_image_path, dst_image_path, label_path, class_ids, yolo_boxes = item
+        try:
+            stage_image(src_image_path, dst_image_path, link_mode, seen)
+            if labels_file is None:
+                write_yolo_labels(label_path, class_ids, yolo_boxes)
+            else:
+                record = {
+                    'img': os.path.basename(dst_image_path),
+                    'cls': class_ids,
+                    'boxes': yolo_boxes
+                }
+                labels_file.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n')
+        except OSError as e:
+            logger.error(f"Error writing {label_path}: {str(e)}")
+            failures.append(label_path)
+
+def _convert_task_to_yolo(task, src_image_path, dst_image_path, label_path, class_map):
+    """Convert a single task to a YOLO image/label pair without writing it.
+    
+    Args:
+        task (dict): Task data loaded by load_label_studio_data
+        src_image_path (str): Exported image path
+        dst_image_path (str): Path the image will be placed at
+        label_path (str): Path the label file will be written to
+        class_map (dict): Mapping from class names to class IDs
+        
+    Returns:
+        tuple: (src_image_path, dst_image_path, label_path, class_ids, yolo_boxes),
+            or None if the task could not be converted
+    """
+    task_id = str(task.get('id', 'unknown'))
+    try:
+        # Get image dimensions, using the size cached in the mapping if present.
+        # A missing image surfaces here, or when the writer stages it.
+        try:
+            img_width, img_height = task.get('image_size') or get_image_size(src_image_path)
+        except FileNotFoundError:
+            logger.warning(f"Image not found: {src_image_path}")
+            return None
+        
+        class_ids = []
+        bboxes = []
+        
+        # Process each annotation
+        for annotation in task.get('annotations', []):
+            for result in annotation.get('result', []):
+                if result.get('type') == 'brushlabels':
+                    # Get class ID
+                    class_name = result['value'].get('brushlabels', ['unknown'])[0]
+                    class_id = class_map.get(class_name, 0)  # Default to 0 if unknown
+                    
+                    # Get bounding box straight from the RLE; the mask itself isn't needed
+                    bbox = rle_to_bbox(result['value']['rle'], result['original_width'],
+                                       result['original_height'])
+                    if bbox is None:
+                        continue
+                    
+                    class_ids.append(class_id)
+                    bboxes.append(bbox)
+        
+        # Convert all boxes to YOLO format at once
+        yolo_boxes = bbox_to_yolo_batch(bboxes, img_width, img_height)
+        
+        return src_image_path, dst_image_path, label_path, class_ids, yolo_boxes
+        
+    except Exception as e:
+        logger.error(f"Error processing task {task_id}: {str(e)}")
+        return None
+
+def export_to_yolo(exported_data_dir, output_dir, link_mode='hardlink', label_format='txt'):
     """Convert exported Label Studio data to YOLO format.
     Assumes data has already been exported using export_project_data.
     
@@ -192,10 +516,20 @@ def export_to_yolo(exported_data_dir, output_dir):
             - images/: Directory with image files
             - image_annotation_pairs.json: Mapping file
         output_dir (str): Directory to save YOLO format dataset
+        link_mode (str, optional): How images are placed in the dataset:
+            'hardlink', 'symlink' or 'copy'. Defaults to 'hardlink'.
+        label_format (str, optional): 'txt' writes one label file per image;
+            'jsonl' writes all labels to a single labels.jsonl, which
+            split_labels can expand later. Defaults to 'txt'.
             
     Returns:
         int: Number of successfully processed annotations
     """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Invalid link mode: {link_mode}. Expected one of {LINK_MODES}")
+    if label_format not in LABEL_FORMATS:
+        raise ValueError(f"Invalid label format: {label_format}. Expected one of {LABEL_FORMATS}")
+    
     # First load the exported data
     try:
         label_data, images_dir = load_label_studio_data(exported_data_dir)
@@ -210,8 +544,10 @@ def export_to_yolo(exported_data_dir, output_dir):
     
     logger.info(f"Converting {len(label_data)} annotations to YOLO format...")
     
-    # Create class mapping from all annotations
+    # Collect class names and resolve every path in one pass over the tasks.
+    # Images keep their (task-prefixed) filename and labels use the same stem.
     unique_classes = set()
+    jobs = []
     for task in label_data:
         for annotation in task.get('annotations', []):
             for result in annotation.get('result', []):
@@ -219,6 +555,14 @@ def export_to_yolo(exported_data_dir, output_dir):
                     unique_classes.update(result['value']['brushlabels'])
                 elif result.get('type') == 'rectanglelabels' and result['value'].get('rectanglelabels'):
                     unique_classes.update(result['value']['rectanglelabels'])
+        
+        image_filename = task['file_upload']
+        jobs.append((
+            task,
+            os.path.join(images_dir, image_filename),
+            os.path.join(yolo_images_dir, image_filename),
+            os.path.join(yolo_labels_dir, f"{os.path.splitext(image_filename)[0]}.txt")
+        ))
     
     # Create sorted mapping to ensure consistent IDs
     class_map = {class_name: idx for idx, class_name in enumerate(sorted(unique_classes))}
@@ -241,64 +585,31 @@ def export_to_yolo(exported_data_dir, output_dir):
             yaml_content.append(f"  {idx}: {name}")
         f.write('\n'.join(yaml_content))
     
-    successful_count = 0
+    # Convert tasks in parallel; each task is independent
+    convert = partial(_convert_task_to_yolo, class_map=class_map)
     
-    # Process each task with progress bar
-    for task in tqdm(label_data, desc="Converting to YOLO format"):
-        try:
-            task_id = str(task['id'])
-            image_filename = task['file_upload']
-            
-            # Get image path - image_filename already includes task_id prefix
-            src_image_path = os.path.join(images_dir, image_filename)
-            if not os.path.exists(src_image_path):
-                logger.warning(f"Image not found: {src_image_path}")
-                continue
-            
-            # Get image dimensions
-            with Image.open(src_image_path) as img:
-                img_width, img_height = img.size
-            
-            # Copy image to YOLO directory - keep the same filename
-            dst_image_path = os.path.join(yolo_images_dir, image_filename)
-            shutil.copy2(src_image_path, dst_image_path)
-            
-            # Create YOLO format label file - use same prefix as image
-            label_filename = f"{os.path.splitext(image_filename)[0]}.txt"
-            label_path = os.path.join(yolo_labels_dir, label_filename)
-            
-            yolo_annotations = []
-            
-            # Process each annotation
-            for annotation in task.get('annotations', []):
-                for result in annotation.get('result', []):
-                    if result.get('type') == 'brushlabels':
-                        # Get class ID
-                        class_name = result['value'].get('brushlabels', ['unknown'])[0]
-                        class_id = class_map.get(class_name, 0)  # Default to 0 if unknown
-                        
-                        # Decode mask
-                        mask = decode_mask(result)
-                        if mask is None:
-                            continue
-                        
-                        # Get bounding box and convert to YOLO format
-                        bbox = mask_to_bbox(mask)
-                        yolo_bbox = bbox_to_yolo(bbox, img_width, img_height)
-                        
-                        # Format: <class> <x_center> <y_center> <width> <height>
-                        yolo_line = f"{class_id} {' '.join(f'{x:.6f}' for x in yolo_bbox)}"
-                        yolo_annotations.append(yolo_line)
-            
-            # Save YOLO format annotations
-            with open(label_path, 'w') as f:
-                f.write('\n'.join(yolo_annotations))
-                
-            successful_count += 1
-            
-        except Exception as e:
-            logger.error(f"Error processing task {task_id}: {str(e)}")
-            continue
+    # Workers only compute; a single writer thread does all the disk writes
+    write_q = queue.Queue(maxsize=64)
+    failures = []
+    labels_file = None
+    if label_format == 'jsonl':
+        labels_file = open(os.path.join(output_dir, 'labels.jsonl'), 'wb')
+    writer = threading.Thread(target=_write_yolo_files, args=(write_q, link_mode, failures, labels_file))
+    writer.start()
+    
+    converted_count = 0
+    try:
+        results = run_parallel(convert, jobs)
+        for item in tqdm(results, total=len(label_data), desc="Converting to YOLO format"):
+            if item is not None:
+                write_q.put(item)
+                converted_count += 1
+    finally:
+        write_q.put(None)
+        writer.join()
+        if labels_file is not None:
+            labels_file.close()
+    successful_count = converted_count - len(failures)
     
     # Save class mapping for reference
     # Sort by class ID to ensure consistent order
@@ -309,8 +620,30 @@ def export_to_yolo(exported_data_dir, output_dir):
     
     logger.info(f"Export complete! Dataset saved to: {os.path.abspath(output_dir)}")
     logger.info(f"- Images: {yolo_images_dir}")
-    logger.info(f"- Labels: {yolo_labels_dir}")
+    logger.info(f"- Labels: {yolo_labels_dir if labels_file is None else labels_file.name}")
     logger.info(f"- Dataset config: {os.path.join(output_dir, 'dataset.yaml')}")
     logger.info(f"- Class mapping: {os.path.join(output_dir, 'classes.txt')}")
     
-    return successful_count 
\ No newline at end of file
+    return successful_count
+
+def split_labels(labels_jsonl_path, labels_dir):
+    """Expand a combined labels.jsonl into one YOLO .txt file per image.
+    
+    Args:
+        labels_jsonl_path (str): Path to labels.jsonl written by export_to_yolo
+        labels_dir (str): Directory to write the label files into
+        
+    Returns:
+        int: Number of label files written
+    """
+    os.makedirs(labels_dir, exist_ok=True)
+    
+    count = 0
+    with open(labels_jsonl_path, 'rb') as f:
+        for line in f:
+            record = orjson.loads(line)
+            label_path = os.path.join(labels_dir, f"{os.path.splitext(record['img'])[0]}.txt")
+            write_yolo_labels(label_path, record['cls'], np.asarray(record['boxes'], dtype=np.float64).reshape(-1, 4))
+            count += 1
+    
+    return count
@@ -13,12 +13,58 @@ import logging
 import os
 import sqlite3
 from pathlib import Path
-from typing import List, Tuple
+from itertools import chain
+from typing import Iterable, Iterator, List, Tuple
 
 logger = logging.getLogger(__name__)
 
 # Common image file extensions
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.gif'}
+_IMAGE_SUFFIXES = tuple(IMAGE_EXTENSIONS)
+
+def _scan_images(dir_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield the images under dir_path in the same order as os.walk.
+    
+    Args:
+        dir_path: Absolute path of the directory to scan
+        
+    Yields:
+        Tuples of (image_path, group_name)
+    """
+    group_name = os.path.basename(dir_path)
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Like os.walk, don't descend into symlinked directories
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(_IMAGE_SUFFIXES):
+                    # Every directory above the entry is already resolved, so
+                    # only symlinked files need realpath to match Path.resolve()
+                    yield (os.path.realpath(entry.path) if entry.is_symlink() else entry.path), group_name
+    except OSError as e:
+        logger.warning(f"Skipping unreadable directory {dir_path}: {str(e)}")
+        return
+    
+    for subdir in subdirs:
+        yield from _scan_images(subdir)
+
+def iter_image_files(folder_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily find all image files in the given folder and extract their group names.
+    
+    Args:
+        folder_path: Path to the folder to search
+        
+    Yields:
+        Tuples of (image_path, group_name)
+    """
+    # Resolve the root once; entries below it are already absolute.
+    # The parent folder name of each image is its group name.
+    return _scan_images(os.path.realpath(folder_path))
 
 def find_image_files(folder_path: str) -> List[Tuple[str, str]]:
     """
@@ -30,31 +76,19 @@ def find_image_files(folder_path: str) -> List[Tuple[str, str]]:
     Returns:
         List of tuples containing (image_path, group_name)
     """
-    results = []
-    folder_path = Path(folder_path).resolve()
+    results = list(iter_image_files(folder_path))
     
-    for root, _, files in os.walk(folder_path):
-        # Get the parent folder name as the group name
-        group_name = Path(root).name
-        
-        for file in files:
-            # Check if the file is an image
-            if Path(file).suffix.lower() in IMAGE_EXTENSIONS:
-                file_path = Path(root) / file
-                # Use absolute path for consistent referencing
-                abs_path = str(file_path.resolve())
-                results.append((abs_path, group_name))
-                
     logger.info(f"Found {len(results)} image files in {folder_path}")
     return results
 
-def create_sqlite_database(output_path: str, images: List[Tuple[str, str]]) -> str:
+def create_sqlite_database(output_path: str, images: Iterable[Tuple[str, str]]) -> str:
     """
     Create a SQLite database with a table for image paths and group names.
     
     Args:
         output_path: Path where the SQLite database will be saved
-        images: List of tuples containing (image_path, group_name)
+        images: Tuples containing (image_path, group_name). A generator is
+            inserted as it is consumed, without being collected first.
         
     Returns:
         str: The actual path where the database was created
@@ -79,6 +113,15 @@ def create_sqlite_database(output_path: str, images: List[Tuple[str, str]]) -> s
         conn = sqlite3.connect(str(output_path))
         cursor = conn.cursor()
         
+        # The rebuild is a single transaction, so NORMAL only syncs at its
+        # commit. A rollback journal (also for databases left in WAL mode by
+        # earlier runs) keeps the database a single file that other tools can
+        # copy or open read-only.
+        cursor.execute("PRAGMA journal_mode=DELETE")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        
         # Create the table for storing image information
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS images (
@@ -88,20 +131,21 @@ def create_sqlite_database(output_path: str, images: List[Tuple[str, str]]) -> s
         )
         ''')
         
-        # Clear existing data if the table already exists
-        cursor.execute("DELETE FROM images")
-        
-        # Insert the image records
-        cursor.executemany(
-            "INSERT INTO images (image_path, group_name) VALUES (?, ?)", 
-            images
-        )
+        # Replace the records in a single transaction; indexing once afterwards
+        # is cheaper than updating the index on every insert
+        with conn:
+            cursor.execute("DROP INDEX IF EXISTS idx_images_group_name")
+            cursor.execute("DELETE FROM images")
+            cursor.executemany(
+                "INSERT INTO images (image_path, group_name) VALUES (?, ?)", 
+                images
+            )
+            record_count = cursor.rowcount
+            cursor.execute("CREATE INDEX idx_images_group_name ON images(group_name)")
         
-        # Commit the changes and close the connection
-        conn.commit()
         conn.close()
         
-        logger.info(f"Created SQLite database at {output_path} with {len(images)} records")
+        logger.info(f"Created SQLite database at {output_path} with {record_count} records")
         return str(output_path)
         
     except sqlite3.Error as e:
@@ -127,18 +171,19 @@ def main():
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
     
-    # Find image files
-    images = find_image_files(args.folder)
+    # Find image files, streaming them into the database as they are found
+    images = iter_image_files(args.folder)
+    first = next(images, None)
     
-    if not images:
+    if first is None:
         logger.warning(f"No image files found in {args.folder}")
         print(f"No image files found in {args.folder}")
         return
     
     # Create the SQLite database
-    db_path = create_sqlite_database(args.output, images)
+    db_path = create_sqlite_database(args.output, chain([first], images))
     
-    print(f"Created SQLite database at {db_path} with {len(images)} image records")
+    print(f"Created SQLite database at {db_path}")
     print(f"You can now use this database with the local_upload.py script:")
     print(f"python -m label_studio_processor.tools.local_upload --db '{db_path}'")
 
@@ -2,7 +2,7 @@
 # upload images to label studio according to the sqlite database that it is given
 # the sqlite database contains the image paths and the group name of the image
 # the group name is the name of the folder that the image is in
-# label studio api key is db746855c4ae789b7ac4c06acde8c6f482da7c05
+# label studio api key is read from the LS_API_KEY environment variable
 # label studio url is http://localhost:8080
 
 import argparse
@@ -11,17 +11,85 @@ import os
 import sqlite3
 import base64
 import io
+import mmap
+import hashlib
+import tempfile
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
+from urllib.parse import quote
 from PIL import Image
 
-from label_studio_processor.client import LabelStudioClient
+from label_studio_processor.cache import CACHE_DIR
+from label_studio_processor.client import get_client
+from label_studio_processor.utils import run_parallel
 
 logger = logging.getLogger(__name__)
 
+# How task images reach Label Studio: inlined as base64, served by Label Studio's
+# local-files storage, or referenced by URL under a static file server
+SERVE_MODES = ("base64", "local-files", "url")
+
+# TIFFs converted to PNG for upload, reused by later runs
+PNG_CACHE_DIR = os.path.join(CACHE_DIR, "png")
+
+def _encode_file(path: str) -> str:
+    """Base64-encode a file from a memory map, without reading it into memory first."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return base64.b64encode(data).decode('ascii')
+
+def _converted_png_path(image_path: str) -> str:
+    """Cache path for an image's PNG conversion, keyed by its path, size and mtime."""
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return os.path.join(PNG_CACHE_DIR, f"{hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()}.png")
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+def convert_tiff_to_png(image_path: str) -> Optional[str]:
+    """Convert a TIFF to PNG in PNG_CACHE_DIR, unless it was converted before.
+    
+    Only the cache path is returned, so this is cheap to run in a worker process.
+    
+    Args:
+        image_path: Path to the TIFF file
+        
+    Returns:
+        Optional[str]: Path to the cached PNG, or None if it could not be written
+    """
+    try:
+        cached_path = _converted_png_path(image_path)
+        if not os.path.exists(cached_path):
+            _convert_to_png(image_path, cached_path)
+        return cached_path
+    except Exception as e:
+        logger.warning(f"Could not convert {image_path} to PNG: {str(e)}")
+        return None
+
+def _convert_to_png(image_path: str, cached_path: str) -> io.BytesIO:
+    """Encode an image as PNG and store it at cached_path, returning the PNG data."""
+    # Favour encoding speed over size, and encode straight from the buffer
+    with Image.open(image_path) as img:
+        output = io.BytesIO()
+        img.save(output, format='PNG', compress_level=1)
+    
+    os.makedirs(PNG_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=PNG_CACHE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(output.getbuffer())
+        os.replace(tmp_path, cached_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output
+
 def read_and_convert_image(image_path: str) -> Tuple[str, str]:
     """Read an image file, convert to PNG if it's a TIFF, and encode to base64.
     
+    TIFF conversions are cached in PNG_CACHE_DIR, so re-uploading the same
+    TIFF skips decoding and PNG compression.
+    
     Args:
         image_path: Path to the image file
         
@@ -31,24 +99,61 @@ def read_and_convert_image(image_path: str) -> Tuple[str, str]:
     try:
         ext = Path(image_path).suffix.lower()
         
-        # If it's a TIFF, convert to PNG
-        if ext in ['.tif', '.tiff']:
-            with Image.open(image_path) as img:
-                output = io.BytesIO()
-                img.save(output, format='PNG')
-                encoded = base64.b64encode(output.getvalue()).decode('utf-8')
-                return encoded, 'image/png'
+        # If it's a TIFF, convert to PNG, reusing an earlier conversion if there is one
+        if ext in TIFF_EXTENSIONS:
+            cached_path = _converted_png_path(image_path)
+            if os.path.exists(cached_path):
+                return _encode_file(cached_path), 'image/png'
+            
+            try:
+                output = _convert_to_png(image_path, cached_path)
+            except OSError as e:
+                # The PNG could still be encoded if only caching it failed
+                logger.warning(f"Could not cache PNG conversion of {image_path}: {str(e)}")
+                with Image.open(image_path) as img:
+                    output = io.BytesIO()
+                    img.save(output, format='PNG', compress_level=1)
+            
+            return base64.b64encode(output.getbuffer()).decode('ascii'), 'image/png'
         else:
-            # For other formats, just read and return
-            with open(image_path, "rb") as f:
-                encoded = base64.b64encode(f.read()).decode('utf-8')
-                mime_type = 'image/png' if ext == '.png' else 'image/jpeg'
-                return encoded, mime_type
+            # For other formats, just encode the file as is
+            mime_type = 'image/png' if ext == '.png' else 'image/jpeg'
+            return _encode_file(image_path), mime_type
                 
     except Exception as e:
         logger.error(f"Failed to process image {image_path}: {str(e)}")
         return None, None
 
+def image_reference(
+    image_path: str,
+    serve_mode: str,
+    document_root: Optional[str] = None,
+    url_prefix: Optional[str] = None
+) -> Optional[str]:
+    """Build the value of a task's image field.
+    
+    Args:
+        image_path: Path to the image file
+        serve_mode: One of SERVE_MODES
+        document_root: Directory served by Label Studio local-files storage
+            (LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT). Used by 'local-files'.
+        url_prefix: Base URL the document root is served under. Used by 'url'.
+        
+    Returns:
+        Optional[str]: Image reference, or None if the image could not be read
+    """
+    if serve_mode == "base64":
+        base64_image, mime_type = read_and_convert_image(image_path)
+        if not base64_image:
+            return None
+        return f"data:{mime_type};base64,{base64_image}"
+    
+    # Referenced images are never read here; paths are relative to the served root
+    rel_path = quote(Path(os.path.relpath(image_path, document_root or "/")).as_posix())
+    if serve_mode == "local-files":
+        return f"/data/local-files/?d={rel_path}"
+    return f"{url_prefix.rstrip('/')}/{rel_path}"
+
 def get_images_from_sqlite(db_path: str) -> List[Dict[str, Any]]:
     """Get image information from SQLite database.
     
@@ -85,23 +190,42 @@ def upload_images_to_label_studio(
     project_id: Optional[int] = None,
     project_name: Optional[str] = "Image Classification",
     url: str = "http://localhost:8080",
-    api_key: str = "db746855c4ae789b7ac4c06acde8c6f482da7c05"
+    api_key: Optional[str] = None,
+    serve_mode: str = "base64",
+    document_root: Optional[str] = None,
+    url_prefix: Optional[str] = None
 ) -> int:
     """Upload images from SQLite database to Label Studio.
     
+    Inlining images as base64 ('base64') needs no server setup but makes every
+    task about a third larger than the image itself. 'local-files' references
+    the images through Label Studio's local-files storage, which must be enabled
+    with LABEL_STUDIO_LOCAL_FILES_SERVING_ENABLED and document_root set to
+    LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT. 'url' references the images under
+    url_prefix. TIFF images are only converted to PNG in 'base64' mode.
+    
     Args:
         db_path: Path to the SQLite database containing image information
         project_id: Optional ID of an existing project to upload to
         project_name: Name for the new project if project_id is not provided
         url: Label Studio instance URL
-        api_key: API key for authentication
+        api_key: API key for authentication. Defaults to the LS_API_KEY
+            environment variable.
+        serve_mode: One of SERVE_MODES. Defaults to 'base64'.
+        document_root: Directory served as local files, see image_reference
+        url_prefix: Base URL for 'url' mode, see image_reference
         
     Returns:
         int: Project ID
     """
+    if serve_mode not in SERVE_MODES:
+        raise ValueError(f"Invalid serve mode: {serve_mode}. Expected one of {SERVE_MODES}")
+    if serve_mode == "url" and not url_prefix:
+        raise ValueError("url_prefix is required for the 'url' serve mode")
+    
     try:
         # Initialize client
-        client = LabelStudioClient(url=url, api_key=api_key)
+        client = get_client(url, api_key or os.environ.get("LS_API_KEY"))
         
         # Create project if not provided
         if project_id is None:
@@ -135,43 +259,55 @@ def upload_images_to_label_studio(
         images = get_images_from_sqlite(db_path)
         logger.info(f"Found {len(images)} images in the database")
         
-        # Prepare tasks for import
-        tasks = []
+        # Skip missing files before any encoding work is scheduled
+        existing = []
         for img in images:
-            image_path = img["image_path"]
-            group_name = img["group_name"]
-            
-            # Check if the file exists
-            if not os.path.isfile(image_path):
-                logger.warning(f"Image not found: {image_path}")
-                continue
-                
-            # Read, convert if needed, and encode the image
-            base64_image, mime_type = read_and_convert_image(image_path)
-            if not base64_image:
+            if not os.path.isfile(img["image_path"]):
+                logger.warning(f"Image not found: {img['image_path']}")
                 continue
+            existing.append(img)
+        
+        # Build and import the tasks one batch at a time, so only a single
+        # batch of encoded images is held in memory
+        batch_size = 500
+        uploaded_count = 0
+        for start in range(0, len(existing), batch_size):
+            batch = existing[start:start + batch_size]
+            
+            # TIFF to PNG conversion is CPU bound, so it is spread over a process
+            # pool; the workers only write the PNG cache and return its paths
+            if serve_mode == "base64":
+                tiffs = [(img["image_path"],) for img in batch
+                         if Path(img["image_path"]).suffix.lower() in TIFF_EXTENSIONS]
+                for _ in run_parallel(convert_tiff_to_png, tiffs):
+                    pass
+            
+            tasks = []
+            for img in batch:
+                image_path = img["image_path"]
+                image = image_reference(image_path, serve_mode, document_root, url_prefix)
+                if not image:
+                    continue
                 
-            task = {
-                "data": {
-                    "image": f"data:{mime_type};base64,{base64_image}",
-                    "metadata": {
-                        "file_path": image_path,
-                        "group": group_name,
-                        "filename": Path(image_path).name,
-                        "converted": Path(image_path).suffix.lower() in ['.tif', '.tiff']
+                task = {
+                    "data": {
+                        "image": image,
+                        "metadata": {
+                            "file_path": image_path,
+                            "group": img["group_name"],
+                            "filename": Path(image_path).name,
+                            "converted": serve_mode == "base64" and Path(image_path).suffix.lower() in TIFF_EXTENSIONS
+                        }
                     }
                 }
-            }
-            tasks.append(task)
-        
-        # Import tasks in batches
-        batch_size = 500
-        for i in range(0, len(tasks), batch_size):
-            batch = tasks[i:i + batch_size]
-            client.import_tasks(project_id, batch)
-            logger.info(f"Imported {len(batch)} tasks to project {project_id}")
+                tasks.append(task)
+            
+            if tasks:
+                client.import_tasks(project_id, tasks)
+                logger.info(f"Imported {len(tasks)} tasks to project {project_id}")
+                uploaded_count += len(tasks)
         
-        logger.info(f"Successfully uploaded {len(tasks)} images to Label Studio project {project_id}")
+        logger.info(f"Successfully uploaded {uploaded_count} images to Label Studio project {project_id}")
         return project_id
         
     except Exception as e:
@@ -184,7 +320,12 @@ def main():
     parser.add_argument("--project-id", type=int, help="Existing Label Studio project ID")
     parser.add_argument("--project-name", default="Image Classification", help="Name for new project")
     parser.add_argument("--url", default="http://localhost:8080", help="Label Studio URL")
-    parser.add_argument("--api-key", default="db746855c4ae789b7ac4c06acde8c6f482da7c05", help="Label Studio API key")
+    parser.add_argument("--api-key", default=os.environ.get("LS_API_KEY"), help="Label Studio API key (defaults to $LS_API_KEY)")
+    parser.add_argument("--serve-mode", default="base64", choices=SERVE_MODES,
+                        help="Inline images as base64, or reference them via local-files storage or a URL")
+    parser.add_argument("--document-root", default=os.environ.get("LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT"),
+                        help="Root directory image references are relative to (defaults to $LABEL_STUDIO_LOCAL_FILES_DOCUMENT_ROOT)")
+    parser.add_argument("--url-prefix", help="Base URL the document root is served under, for --serve-mode url")
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level")
     
     args = parser.parse_args()
@@ -201,7 +342,10 @@ def main():
         project_id=args.project_id,
         project_name=args.project_name,
         url=args.url,
-        api_key=args.api_key
+        api_key=args.api_key,
+        serve_mode=args.serve_mode,
+        document_root=args.document_root,
+        url_prefix=args.url_prefix
     )
     
     print(f"Images uploaded to project: {project_id}")
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""
+This script expands the combined labels.jsonl written by export_to_yolo(label_format='jsonl')
+into one YOLO .txt label file per image, for trainers that expect the per-file layout.
+"""
+
+import argparse
+import logging
+import os
+
+from label_studio_processor.export import split_labels
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a combined YOLO labels.jsonl into per-image label files")
+    parser.add_argument("--labels", required=True, help="Path to labels.jsonl")
+    parser.add_argument("--output", help="Directory for the .txt label files (defaults to 'labels' next to labels.jsonl)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level")
+    
+    args = parser.parse_args()
+    
+    # Setup logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    
+    output_dir = args.output or os.path.join(os.path.dirname(os.path.abspath(args.labels)), "labels")
+    count = split_labels(args.labels, output_dir)
+    
+    logger.info(f"Wrote {count} label files to {output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,100 @@
 import numpy as np
 from PIL import Image
-import requests
 from io import BytesIO
-from label_studio_sdk.converter.brush import decode_from_annotation
 import logging
 import os
+import struct
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tqdm import tqdm
+from .client import create_session
+try:
+    import cv2
+except ImportError:  # opencv is optional; bboxes fall back to NumPy
+    cv2 = None
 
 logger = logging.getLogger(__name__)
 
+# Below this many items a process pool costs more to start than it saves
+INLINE_TASK_THRESHOLD = 4
+MAX_TASK_CHUNKSIZE = 16
+
+# Bool masks up to this many pixels are faster through cv2.boundingRect than NumPy
+CV2_BOOL_MAX_PIXELS = 512 * 512
+
+# Result types whose labels are used as classes
+LABEL_TYPES = ('brushlabels', 'rectanglelabels')
+
+# Separators that mark a file_upload name as a path below the images directory
+PATH_SEPARATORS = tuple({sep for sep in ('/', os.sep, os.altsep) if sep})
+
+def _pool_context():
+    """Multiprocessing context for worker pools that never forks the caller.
+    
+    Callers may have other threads running (export_to_yolo's writer thread,
+    logging), and forking while one of them holds a lock can deadlock the
+    workers. forkserver is used where available, spawn everywhere else.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def run_parallel(func, args_list, inline_threshold=INLINE_TASK_THRESHOLD):
+    """Run func over argument tuples in a process pool, yielding results in order.
+    
+    Small inputs, or machines with a single CPU, run inline in the current process.
+    Calls are sent to the workers in chunks of up to MAX_TASK_CHUNKSIZE so the
+    pickling and IPC overhead is paid per chunk rather than per call.
+    
+    Workers are started with forkserver (or spawn), never by forking the
+    calling process.
+    
+    Args:
+        func (callable): Picklable top-level function
+        args_list (list): Argument tuples, one per call
+        inline_threshold (int, optional): Run inline when there are at most this
+            many items. Defaults to INLINE_TASK_THRESHOLD.
+            
+    Yields:
+        The result of each call, in input order
+    """
+    workers = os.cpu_count() or 1
+    if len(args_list) <= inline_threshold or workers == 1:
+        for args in args_list:
+            yield func(*args)
+        return
+    
+    # Aim for a few chunks per worker so the load still balances
+    chunksize = max(1, min(MAX_TASK_CHUNKSIZE, len(args_list) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+        yield from executor.map(func, *zip(*args_list), chunksize=chunksize)
+
+def _bounding_rect(mask):
+    """Compute the bounding box of a uint8 mask with OpenCV in a single pass.
+    
+    Args:
+        mask (numpy.ndarray): 2D uint8 or bool mask
+        
+    Returns:
+        tuple: (x_min, y_min, x_max, y_max), or None if the mask is empty
+    """
+    # Bool masks are read as uint8 through a zero-copy view
+    x, y, w, h = cv2.boundingRect(np.ascontiguousarray(mask).view(np.uint8))
+    if w == 0:
+        return None
+    return (x, y, x + w - 1, y + h - 1)
+
+def _use_cv2(mask):
+    """Whether cv2.boundingRect can be used for this mask.
+    
+    OpenCV scans uint8 masks faster than the NumPy reductions. For bool masks it
+    only wins on small masks, where the fixed cost of the NumPy calls dominates.
+    """
+    if cv2 is None or mask.ndim != 2:
+        return False
+    return mask.dtype == np.uint8 or (mask.dtype == np.bool_ and mask.size <= CV2_BOOL_MAX_PIXELS)
+
 def mask_to_bbox(mask):
     """Convert binary mask to bounding box.
     
@@ -16,17 +102,230 @@ def mask_to_bbox(mask):
         mask (numpy.ndarray): Binary mask
         
     Returns:
-        tuple: (x_min, y_min, x_max, y_max)
+        tuple: (x_min, y_min, x_max, y_max), or None if the mask is empty
+    """
+    # Reduce the mask in its own dtype; a bool copy would cost more than the reductions
+    mask = np.asarray(mask)
+    if _use_cv2(mask):
+        return _bounding_rect(mask)
+    rows = mask.any(axis=1)
+    if not rows.any():
+        return None
+    cols = mask.any(axis=0)
+    
+    # argmax stops at the first True; the reversed views find the last one
+    y_min = int(rows.argmax())
+    y_max = len(rows) - 1 - int(rows[::-1].argmax())
+    x_min = int(cols.argmax())
+    x_max = len(cols) - 1 - int(cols[::-1].argmax())
+    
+    return (x_min, y_min, x_max, y_max)
+
+def masks_to_bboxes(masks):
+    """Convert a batch of same-shape binary masks to bounding boxes at once.
+    
+    Args:
+        masks (numpy.ndarray or list): (B, H, W) masks, or a list of (H, W) masks
+        
+    Returns:
+        list: (x_min, y_min, x_max, y_max) per mask, or None for empty masks
+    """
+    # OpenCV on each uint8 mask beats a stacked bool copy plus reductions
+    if cv2 is not None and all(isinstance(mask, np.ndarray) and _use_cv2(mask) for mask in masks):
+        return [_bounding_rect(mask) for mask in masks]
+    
+    masks = np.asarray(masks, dtype=bool)
+    if len(masks) == 0:
+        return []
+    rows = masks.any(axis=2)
+    cols = masks.any(axis=1)
+    
+    # Same argmax edges as mask_to_bbox, computed for every mask in one call
+    boxes = np.stack([
+        cols.argmax(axis=1),
+        rows.argmax(axis=1),
+        cols.shape[1] - 1 - cols[:, ::-1].argmax(axis=1),
+        rows.shape[1] - 1 - rows[:, ::-1].argmax(axis=1)
+    ], axis=1).tolist()
+    
+    return [tuple(box) if nonempty else None for box, nonempty in zip(boxes, rows.any(axis=1).tolist())]
+
+def pack_mask(mask):
+    """Pack a binary mask to one bit per pixel along its rows.
+    
+    Args:
+        mask (numpy.ndarray): Binary mask of shape (height, width)
+        
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, ceil(width / 8))
+    """
+    return np.packbits(np.asarray(mask) > 0, axis=-1)
+
+def unpack_mask(packed, width):
+    """Unpack a mask packed with pack_mask.
+    
+    Args:
+        packed (numpy.ndarray): Packed mask of shape (height, ceil(width / 8))
+        width (int): Width of the original mask
+        
+    Returns:
+        numpy.ndarray: uint8 mask of shape (height, width) with values 0 and 1
+    """
+    return np.unpackbits(packed, axis=-1, count=width)
+
+def get_image_size(image_path):
+    """Read image dimensions from the file header without decoding the image.
+    
+    Supports PNG, JPEG and GIF headers and falls back to PIL for other formats.
+    
+    Args:
+        image_path (str): Path to the image file
+        
+    Returns:
+        tuple: (width, height)
+    """
+    with open(image_path, 'rb') as f:
+        head = f.read(26)
+        
+        # PNG: width and height are the first fields of the IHDR chunk
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        
+        # GIF: little-endian logical screen size
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        
+        # JPEG: walk the markers until a start-of-frame segment
+        if head[:2] == b'\xff\xd8':
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    break
+                if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                    continue
+                length = struct.unpack('>H', f.read(2))[0]
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack('>xHH', f.read(5))
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    
+    # Fall back to PIL, which also only reads the header
+    with Image.open(image_path) as img:
+        return img.size
+
+def _rle_runs(rle):
+    """Parse a Label Studio brush RLE into runs over the flattened RGBA values.
+    
+    Label Studio packs the RLE as a bit stream: a header (value count, word size
+    and four run-length field sizes) followed by runs that either repeat one
+    value or list literal values.
+    
+    Args:
+        rle (list): Label Studio RLE bytes
+        
+    Returns:
+        tuple: (num, lengths, values) where num is the number of flattened RGBA
+            values and lengths/values are int arrays describing consecutive runs
     """
-    rows = np.any(mask, axis=1)
-    cols = np.any(mask, axis=0)
-    y_min, y_max = np.where(rows)[0][[0, -1]]
-    x_min, x_max = np.where(cols)[0][[0, -1]]
+    # Unpack all bits at once instead of bit by bit
+    if isinstance(rle, bytes):
+        rle = np.frombuffer(rle, dtype=np.uint8)
+    bits = (np.unpackbits(np.asarray(rle, dtype=np.uint8)) + ord('0')).tobytes()
+    
+    num = int(bits[0:32], 2)
+    word_size = int(bits[32:37], 2) + 1
+    rle_sizes = [int(bits[37 + 4 * k:41 + 4 * k], 2) + 1 for k in range(4)]
+    weights = 1 << np.arange(word_size - 1, -1, -1)
     
-    return (int(x_min), int(y_min), int(x_max), int(y_max))
+    lengths = []
+    values = []
+    i = 0
+    pos = 53
+    while i < num:
+        repeat = bits[pos] == 49  # ord('1')
+        size = rle_sizes[int(bits[pos + 1:pos + 3], 2)]
+        pos += 3
+        run_length = int(bits[pos:pos + size], 2) + 1
+        pos += size
+        if repeat:
+            lengths.append(run_length)
+            values.append(int(bits[pos:pos + word_size], 2))
+            pos += word_size
+        else:
+            # Literal values: decode the whole block in one go
+            end = pos + run_length * word_size
+            words = np.frombuffer(bits[pos:end], dtype=np.uint8).reshape(run_length, word_size) - ord('0')
+            lengths.extend([1] * run_length)
+            values.extend((words @ weights).tolist())
+            pos = end
+        i += run_length
+    
+    return num, np.array(lengths, dtype=np.int64), np.array(values, dtype=np.int64)
 
-def decode_mask(result):
-    """Decode mask from Label Studio annotation result using the SDK.
+def rle_to_bbox(rle, width, height):
+    """Compute the bounding box of a brush mask directly from its RLE runs.
+    
+    Equivalent to mask_to_bbox(decode_mask(result)) without building the mask.
+    
+    Args:
+        rle (list): Label Studio RLE bytes
+        width (int): Image width
+        height (int): Image height
+        
+    Returns:
+        tuple: (x_min, y_min, x_max, y_max), or None if the mask is empty
+    """
+    num, lengths, values = _rle_runs(rle)
+    ends = np.minimum(np.cumsum(lengths), min(num, width * height * 4)) - 1
+    starts = ends - lengths + 1
+    
+    # Keep non-zero runs, narrowed to the alpha channel (every 4th value)
+    on = values > 0
+    first_alpha = starts[on] + (3 - starts[on] % 4)
+    last_alpha = ends[on] - (ends[on] + 1) % 4
+    valid = first_alpha <= last_alpha
+    if not valid.any():
+        return None
+    first_pixel = first_alpha[valid] // 4
+    last_pixel = last_alpha[valid] // 4
+    
+    first_row, first_col = np.divmod(first_pixel, width)
+    last_row, last_col = np.divmod(last_pixel, width)
+    
+    # Runs that wrap onto another row cover the full width between them
+    single_row = first_row == last_row
+    x_min = np.where(single_row, first_col, 0).min()
+    x_max = np.where(single_row, last_col, width - 1).max()
+    
+    return (int(x_min), int(first_row.min()), int(x_max), int(last_row.max()))
+
+def decode_rle(rle, width, height, binary=False):
+    """Decode a Label Studio brush RLE into its alpha channel.
+    
+    Args:
+        rle (list): Label Studio RLE bytes
+        width (int): Image width
+        height (int): Image height
+        binary (bool): Return 0/1 instead of the raw alpha values
+        
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, width)
+    """
+    num, lengths, values = _rle_runs(rle)
+    if binary:
+        # Binarize once per run rather than once per pixel
+        values = values > 0
+    ends = np.minimum(np.cumsum(lengths), num)
+    starts = ends - lengths
+    
+    # Expand each run only over the alpha positions (4k + 3) it covers, so the
+    # RGB channels are never materialized
+    alpha_counts = ends // 4 - starts // 4
+    return np.repeat(values.astype(np.uint8), alpha_counts).reshape(height, width)
+
+def decode_mask(result, cache=None):
+    """Decode mask from Label Studio annotation result.
     
     Args:
         result (dict): Annotation result from Label Studio containing:
@@ -34,6 +333,9 @@ def decode_mask(result):
             - value: dict with 'rle' and 'brushlabels'
             - original_width: image width
             - original_height: image height
+        cache (dict, optional): Memo of already decoded masks, keyed on the
+            raw RLE bytes and image size. Masks taken from or stored in it are
+            read-only, as they are shared by every result with the same RLE.
             
     Returns:
         numpy.ndarray: Binary mask of shape (height, width)
@@ -43,39 +345,90 @@ def decode_mask(result):
         return None
         
     try:
-        # Format result for the decoder
-        formatted_result = [{
-            'type': 'brushlabels',
-            'rle': result['value']['rle'],
-            'original_width': result['original_width'],
-            'original_height': result['original_height'],
-            'brushlabels': result['value']['brushlabels']
-        }]
+        # Ensure mask is binary (0 or 1)
+        rle_bytes = bytes(result['value']['rle'])
+        width = result['original_width']
+        height = result['original_height']
+        if cache is None:
+            return decode_rle(rle_bytes, width, height, binary=True)
         
-        # Decode using label-studio-sdk
-        layers = decode_from_annotation('image', formatted_result)
+        # Duplicated masks are decoded only once per cache
+        key = (rle_bytes, width, height)
+        mask = cache.get(key)
+        if mask is None:
+            mask = decode_rle(rle_bytes, width, height, binary=True)
+            mask.flags.writeable = False
+            cache[key] = mask
+        return mask
         
-        # Get the first layer (assuming single class)
-        for _, mask in layers.items():
-            # Ensure mask is binary (0 or 1)
-            return (mask > 0).astype(np.uint8)
-            
     except Exception as e:
         logger.error(f"Error decoding mask: {str(e)}")
         return None
 
+@functools.lru_cache(maxsize=None)
+def _download_session():
+    """Shared keep-alive session for download_image, created on first use."""
+    return create_session()
+
 def download_image(url):
     """Download image from URL.
     
+    Connections are pooled across calls, so repeated downloads from the same
+    host skip the TCP and TLS handshakes.
+    
     Args:
         url (str): Image URL
         
     Returns:
         PIL.Image: Downloaded image
     """
-    response = requests.get(url)
+    response = _download_session().get(url)
     return Image.open(BytesIO(response.content))
 
+def download_images(urls, max_workers=16):
+    """Download many images concurrently over the shared session.
+    
+    Args:
+        urls (list): Image URLs
+        max_workers (int): Maximum number of concurrent downloads
+        
+    Returns:
+        list: PIL Images in the same order as urls
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(tqdm(executor.map(download_image, urls), total=len(urls), desc="Downloading images"))
+
+def _update_task_classes(task, unique_classes):
+    """Add the brush and rectangle labels used by a task to a set.
+    
+    Args:
+        task (dict): Task from Label Studio with annotations
+        unique_classes (set): Set of class names to update in place
+    """
+    # Each result stores its labels under a key named after its type
+    unique_classes.update(
+        label
+        for annotation in task['annotations']
+        for result in annotation['result']
+        if result['type'] in LABEL_TYPES
+        for label in result['value'].get(result['type']) or ()
+    )
+
+def _class_map_from_names(unique_classes):
+    """Assign class IDs to a set of class names.
+    
+    Args:
+        unique_classes (set): Class names
+        
+    Returns:
+        dict: Mapping from class names to integer IDs
+    """
+    # Create mapping (sorted to ensure consistent IDs)
+    class_map = {class_name: idx for idx, class_name in enumerate(sorted(unique_classes))}
+    
+    logger.info(f"Found {len(class_map)} unique classes: {class_map}")
+    return class_map
+
 def create_class_mapping(label_json):
     """Create a mapping of class names to class IDs from all annotations.
     
@@ -89,28 +442,21 @@ def create_class_mapping(label_json):
     
     # Collect all unique class names
     for task in label_json:
-        if not task['annotations']:
-            continue
-            
-        for annotation in task['annotations']:
-            for result in annotation['result']:
-                if result['type'] == 'brushlabels' and result['value'].get('brushlabels'):
-                    unique_classes.update(result['value']['brushlabels'])
-                elif result['type'] == 'rectanglelabels' and result['value'].get('rectanglelabels'):
-                    unique_classes.update(result['value']['rectanglelabels'])
-    
-    # Create mapping (sorted to ensure consistent IDs)
-    class_map = {class_name: idx for idx, class_name in enumerate(sorted(unique_classes))}
+        if task['annotations']:
+            _update_task_classes(task, unique_classes)
     
-    logger.info(f"Found {len(class_map)} unique classes: {class_map}")
-    return class_map
+    return _class_map_from_names(unique_classes)
 
-def parse_annotation(annotation, class_map):
+def parse_annotation(annotation, class_map, min_area=0, mask_cache=None):
     """Parse a single Label Studio annotation to extract masks and bounding boxes.
     
     Args:
         annotation (dict): Label Studio annotation containing results
         class_map (dict): Mapping from class names to class IDs
+        min_area (int, optional): Skip masks with fewer foreground pixels than
+            this. Defaults to 0 (only empty masks are skipped).
+        mask_cache (dict, optional): Memo passed to decode_mask, so masks
+            repeated across annotations are decoded once
         
     Returns:
         tuple: (masks, bboxes, class_ids, status) where:
@@ -124,93 +470,199 @@ def parse_annotation(annotation, class_map):
     class_ids = []
     status = 'ok'
     
+    # Decode every result first so the mask and rectangle bboxes can be computed in one batch
+    entries = []
+    rectangles = []
     for result in annotation['result']:
-        mask = None
-        bbox = None
-        class_name = None
+        result_type = result['type']
+        value = result['value']
         
         # Get mask from brush labels
-        if result['type'] == 'brushlabels':
-            mask = decode_mask(result)
-            if result['value'].get('brushlabels'):
-                class_name = result['value']['brushlabels'][0]
+        if result_type == 'brushlabels':
+            mask = decode_mask(result, mask_cache)
+            if mask is not None:
+                labels = value.get('brushlabels')
+                entries.append([mask, None, labels[0] if labels else None])
             
         # Get bbox from rectangle labels
-        elif result['type'] == 'rectanglelabels':
-            value = result['value']
+        elif result_type == 'rectanglelabels':
             x = value['x']
             y = value['y']
-            width = value['width']
-            height = value['height']
             original_width = result['original_width']
             original_height = result['original_height']
+            labels = value.get('rectanglelabels')
             
-            # Convert percentages to absolute coordinates
-            x_min = int((x / 100) * original_width)
-            y_min = int((y / 100) * original_height)
-            x_max = int(((x + width) / 100) * original_width)
-            y_max = int(((y + height) / 100) * original_height)
-            
-            bbox = [x_min, y_min, x_max, y_max]
-            
-            if result['value'].get('rectanglelabels'):
-                class_name = result['value']['rectanglelabels'][0]
+            # Percent corners and image size; converted below with the other rectangles
+            entry = [None, None, labels[0] if labels else None]
+            rectangles.append((
+                entry,
+                (x, y, x + value['width'], y + value['height']),
+                (original_width, original_height, original_width, original_height)
+            ))
+            entries.append(entry)
+    
+    # Convert all rectangle percentages to absolute coordinates at once
+    if rectangles:
+        group, corners, sizes = zip(*rectangles)
+        absolute = (np.array(corners, dtype=np.float64) / 100 * np.array(sizes)).astype(np.int64)
+        for entry, bbox in zip(group, absolute.tolist()):
+            entry[1] = bbox
+    
+    # Compute bboxes for masks without one, batched per mask shape
+    by_shape = {}
+    for entry in entries:
+        if entry[0] is not None and entry[1] is None:
+            by_shape.setdefault(entry[0].shape, []).append(entry)
+    for group in by_shape.values():
+        for entry, bbox in zip(group, masks_to_bboxes([entry[0] for entry in group])):
+            entry[1] = bbox
+    
+    get_class_id = class_map.get
+    for mask, bbox, class_name in entries:
+        # Skip empty masks, and masks below the minimum area
+        if bbox is None:
+            continue
+        if min_area and mask is not None and np.count_nonzero(mask) < min_area:
+            continue
         
-        # Process this result if we have either a mask or bbox
-        if mask is not None or bbox is not None:
-            # If we have a mask but no bbox, compute bbox from mask
-            if mask is not None and bbox is None:
-                bbox = mask_to_bbox(mask)
-            
-            # Convert class name to ID
-            if class_name is None:
-                class_id = 0
-                if status == 'ok':  # Don't override more severe status
-                    status = 'no_class'
-            else:
-                if class_name not in class_map:
-                    class_id = 0
-                    if status == 'ok':  # Don't override more severe status
-                        status = 'unknown_class'
-                else:
-                    class_id = class_map[class_name]
-            
-            # Add to our lists
-            if mask is not None:
-                masks.append(mask)
-            if bbox is not None:
-                bboxes.append(bbox)
-            class_ids.append(class_id)
+        # Convert class name to ID with a single lookup
+        class_id = get_class_id(class_name) if class_name is not None else None
+        if class_id is None:
+            class_id = 0
+            if status == 'ok':  # Don't override more severe status
+                status = 'no_class' if class_name is None else 'unknown_class'
+        
+        # Add to our lists
+        if mask is not None:
+            masks.append(mask)
+        bboxes.append(bbox)
+        class_ids.append(class_id)
     
     return masks, bboxes, class_ids, status
 
-def prepare_training_data(label_json, images_dir):
+def _prepare_task(task, images_dir, available, class_map, keep_images, target_size=None, pack_masks=False,
+                  min_area=0, mask_cache=None, keep_masks=True):
+    """Parse all annotations of a task and open its image.
+    
+    Args:
+        task (dict): Task from Label Studio with a file_upload image filename
+        images_dir (str): Path to directory containing the exported images
+        available (set): Filenames present in images_dir
+        class_map (dict): Mapping from class names to class IDs
+        keep_images (bool): Open the image instead of returning its path
+        target_size (tuple, optional): (width, height) the image will be resized to
+        pack_masks (bool): Return each mask as a (packed_rows, width) tuple,
+            packed with pack_mask
+        min_area (int): Minimum number of foreground pixels for a mask to be kept
+        mask_cache (dict, optional): Memo of decoded masks shared by all tasks
+        keep_masks (bool): Return each mask's foreground pixel count instead
+            of the mask
+        
+    Returns:
+        tuple: (masks, bboxes, class_ids, statuses, error_count, image) where
+            statuses holds each parsed annotation's status and image is the
+            PIL Image (or path), or None if there are no masks or the image
+            is missing
+    """
+    task_masks = []
+    task_boxes = []
+    task_classes = []
+    statuses = []
+    error_count = 0
+    
+    # Process all annotations for this task
+    for annotation in task['annotations']:
+        try:
+            # Parse annotation to get masks, bboxes and classes
+            ann_masks, ann_boxes, ann_classes, status = parse_annotation(annotation, class_map, min_area, mask_cache)
+            statuses.append(status)
+            
+            # Add valid masks and their corresponding boxes/classes
+            if ann_masks:
+                task_masks.extend(ann_masks)
+                task_boxes.extend(ann_boxes)
+                task_classes.extend(ann_classes)
+                
+        except Exception as e:
+            error_count += 1
+            logger.warning(f"Error processing annotation in task {task['id']}: {str(e)}")
+            continue
+    
+    if not task_masks:
+        return task_masks, task_boxes, task_classes, statuses, error_count, None
+    
+    if not keep_masks:
+        # Only the areas are needed, so the masks are dropped right here
+        task_masks = [int(np.count_nonzero(mask)) for mask in task_masks]
+    elif pack_masks:
+        # Packing pads rows to whole bytes, so keep each mask's own width
+        task_masks = [(pack_mask(mask), mask.shape[1]) for mask in task_masks]
+    
+    # Load local image using the mapping info. available only lists the top
+    # level of images_dir, so names with a directory part need their own check.
+    file_upload = task['file_upload']
+    image_path = os.path.join(images_dir, file_upload)
+    if file_upload not in available and not (
+        any(sep in file_upload for sep in PATH_SEPARATORS) and os.path.exists(image_path)
+    ):
+        return task_masks, task_boxes, task_classes, statuses, error_count, None
+    
+    if not keep_images:
+        return task_masks, task_boxes, task_classes, statuses, error_count, image_path
+    
+    image = Image.open(image_path)
+    if target_size is not None:
+        # Let libjpeg decode at a reduced scale that still covers target_size;
+        # a no-op for formats without draft support
+        image.draft(image.mode, target_size)
+    return task_masks, task_boxes, task_classes, statuses, error_count, image
+
+def prepare_training_data(label_json, images_dir, keep_images=True, target_size=None, pack_masks=False,
+                          min_area=0, keep_masks=True):
     """Prepare training data from Label Studio JSON export.
     Handles multiple masks/annotations per image.
     
     Args:
         label_json (list): List of task dictionaries from Label Studio
         images_dir (str): Path to directory containing the exported images
+        keep_images (bool, optional): If False, store image paths instead of
+            opened PIL Images. Defaults to True.
+        target_size (tuple, optional): (width, height) the images will be resized
+            to downstream. JPEGs are then decoded at the smallest scale that is
+            still at least this large, so image.size may be smaller than the
+            original while boxes and masks stay in original pixel coordinates.
+            Defaults to None (full resolution).
+        pack_masks (bool, optional): Store each mask as a (packed_rows, width)
+            tuple, packed to one bit per pixel with pack_mask, 8x smaller than
+            uint8 masks. width is the mask's own width (the annotation's
+            original_width), which may differ from the image file's. Unpack
+            them with unpack_mask(*mask). Defaults to False.
+        min_area (int, optional): Drop masks with fewer foreground pixels than
+            this; tasks left without masks are counted as having no valid masks.
+            Defaults to 0 (only empty masks are dropped).
+        keep_masks (bool, optional): If False, masks are dropped as soon as
+            they are parsed and only their foreground pixel counts are kept,
+            in mask_areas; masks is then empty. Enough for
+            get_dataset_statistics. Defaults to True.
         
     Returns:
         dict: Dictionary containing:
-            - images: Dict mapping image IDs to PIL Images
+            - images: Dict mapping image IDs to PIL Images (or paths)
             - masks: Dict mapping image IDs to lists of binary masks
+            - mask_areas: Dict mapping image IDs to lists of mask areas, only
+              if keep_masks is False
             - box_prompts: Dict mapping image IDs to lists of bounding boxes
             - class_ids: Dict mapping image IDs to lists of class IDs
             - class_map: Dict mapping class names to class IDs
+            - task_ids: List of the prepared task IDs, in order
     """
-    # Create class mapping first
-    class_map = create_class_mapping(label_json)
-    
     images = {}
     masks = {}
     box_prompts = {}
     class_ids = {}
+    mask_areas = {}
     
     # Initialize counters
-    total_count = len(label_json)
-    no_annotation_count = total_count - len([task for task in label_json if task.get('annotations')])
     no_class_count = 0
     unknown_class_count = 0
     no_mask_count = 0
@@ -218,62 +670,67 @@ def prepare_training_data(label_json, images_dir):
     error_count = 0
     total_mask_count = 0
     
-    # Filter tasks with annotations first
-    valid_tasks = [task for task in label_json if task.get('annotations')]
+    # Filter tasks with annotations and collect their class names in one pass.
+    # Class IDs come from the sorted set of all names, so the mapping must be
+    # complete before any annotation is parsed.
+    valid_tasks = []
+    unique_classes = set()
+    for task in label_json:
+        if task.get('annotations'):
+            valid_tasks.append(task)
+            _update_task_classes(task, unique_classes)
+    class_map = _class_map_from_names(unique_classes)
+    
+    no_annotation_count = len(label_json) - len(valid_tasks)
     if no_annotation_count > 0:
         logger.info(f"Skipping {no_annotation_count} tasks without annotations")
     
-    # Process each task with progress bar
-    for task in tqdm(valid_tasks, desc="Processing annotations"):
-        task_id = str(task['id'])
-        task_masks = []
-        task_boxes = []
-        task_classes = []
-        
-        # Process all annotations for this task
-        for annotation in task['annotations']:
-            try:
-                # Parse annotation to get masks, bboxes and classes
-                ann_masks, ann_boxes, ann_classes, status = parse_annotation(annotation, class_map)
-                
-                # Track status
-                if status == 'no_class':
-                    no_class_count += 1
-                elif status == 'unknown_class':
-                    unknown_class_count += 1
-                
-                # Add valid masks and their corresponding boxes/classes
-                if ann_masks:
-                    task_masks.extend(ann_masks)
-                    task_boxes.extend(ann_boxes)
-                    task_classes.extend(ann_classes)
-                    
-            except Exception as e:
-                error_count += 1
-                logger.warning(f"Error processing annotation in task {task_id}: {str(e)}")
+    # List the images once instead of checking every task's file with a stat call
+    available = set(os.listdir(images_dir)) if os.path.isdir(images_dir) else set()
+    
+    # Identical RLEs are decoded once for this call and share one read-only
+    # mask. Packed masks are built per task, so the memo would only keep
+    # unpacked masks alive; skip it then.
+    mask_cache = None if pack_masks or not keep_masks else {}
+    
+    # Decode masks and open images on a thread pool; NumPy and PIL release the
+    # GIL for most of that work. Results are consumed in task order.
+    with ThreadPoolExecutor() as executor:
+        results = executor.map(
+            lambda task: _prepare_task(
+                task, images_dir, available, class_map, keep_images, target_size, pack_masks, min_area,
+                mask_cache, keep_masks
+            ),
+            valid_tasks
+        )
+        for task, result in tqdm(zip(valid_tasks, results), total=len(valid_tasks), desc="Processing annotations"):
+            task_id = str(task['id'])
+            task_masks, task_boxes, task_classes, statuses, task_error_count, image = result
+            
+            # Track status
+            no_class_count += statuses.count('no_class')
+            unknown_class_count += statuses.count('unknown_class')
+            error_count += task_error_count
+            
+            # Skip if no valid masks found
+            if not task_masks:
+                no_mask_count += 1
                 continue
-        
-        # Skip if no valid masks found
-        if not task_masks:
-            no_mask_count += 1
-            continue
             
-        # Load local image using the mapping info
-        image_filename = task['file_upload']
-        image_path = os.path.join(images_dir, image_filename)
-        if not os.path.exists(image_path):
-            missing_image_count += 1
-            continue
+            if image is None:
+                missing_image_count += 1
+                continue
             
-        image = Image.open(image_path)
-        
-        # Store all data for this task
-        images[task_id] = image
-        masks[task_id] = task_masks
-        box_prompts[task_id] = task_boxes
-        class_ids[task_id] = task_classes
-        
-        total_mask_count += len(task_masks)
+            # Store all data for this task
+            images[task_id] = image
+            if keep_masks:
+                masks[task_id] = task_masks
+            else:
+                mask_areas[task_id] = task_masks
+            box_prompts[task_id] = task_boxes
+            class_ids[task_id] = task_classes
+            
+            total_mask_count += len(task_masks)
     
     # Log summary
     logger.info(f"Successfully prepared {len(images)} images with {total_mask_count} total masks")
@@ -295,13 +752,33 @@ def prepare_training_data(label_json, images_dir):
     if len(images) == 0:
         logger.warning("No valid samples found in the dataset!")
     
-    return {
+    data = {
         'images': images,
         'masks': masks,
         'box_prompts': box_prompts,
         'class_ids': class_ids,
-        'class_map': class_map
+        'class_map': class_map,
+        'task_ids': list(images)
     }
+    if not keep_masks:
+        data['mask_areas'] = mask_areas
+    return data
+
+def get_image(prepared_data, task_id):
+    """Get a task's image from prepare_training_data output.
+    
+    Images stored as paths (keep_images=False) are opened on demand, so only
+    the images actually used hold a file handle.
+    
+    Args:
+        prepared_data (dict): Output of prepare_training_data
+        task_id (str): Task ID
+        
+    Returns:
+        PIL.Image: The task image
+    """
+    image = prepared_data['images'][task_id]
+    return Image.open(image) if isinstance(image, str) else image
 
 def bbox_to_yolo(bbox, img_width, img_height):
     """Convert (x_min, y_min, x_max, y_max) to YOLO format (x_center, y_center, width, height).
@@ -331,4 +808,36 @@ def bbox_to_yolo(bbox, img_width, img_height):
     width = width / img_width
     height = height / img_height
     
-    return x_center, y_center, width, height 
\ No newline at end of file
+    return x_center, y_center, width, height
+
+def bbox_to_yolo_batch(bboxes, img_width, img_height):
+    """Convert an array of (x_min, y_min, x_max, y_max) boxes to YOLO format.
+    
+    Boxes from different images can be converted together by passing one
+    width and height per box.
+    
+    Args:
+        bboxes (array-like): Bounding boxes of shape (N, 4)
+        img_width (int or array-like): Image width, or (N,) widths per box
+        img_height (int or array-like): Image height, or (N,) heights per box
+        
+    Returns:
+        numpy.ndarray: Array of shape (N, 4) with (x_center, y_center, width, height)
+            normalized to [0, 1]
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+    sizes = bboxes[:, 2:] - bboxes[:, :2]
+    scale = np.stack(np.broadcast_arrays(img_width, img_height, img_width, img_height), axis=-1)
+    return np.hstack([centers, sizes]) / scale
+
+def write_yolo_labels(label_path, class_ids, yolo_boxes):
+    """Write YOLO label lines '<class> <x_center> <y_center> <width> <height>'.
+    
+    Args:
+        label_path (str or file): Path of the label file to write, or an open text file
+        class_ids (array-like): Class ID for each box
+        yolo_boxes (numpy.ndarray): Normalized boxes of shape (N, 4)
+    """
+    rows = np.column_stack([np.asarray(class_ids, dtype=np.float64), yolo_boxes])
+    np.savetxt(label_path, rows, fmt=['%d', '%.6f', '%.6f', '%.6f', '%.6f'])
\ No newline at end of file
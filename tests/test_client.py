@@ -1,7 +1,10 @@
+import os
+import json
 import pytest
 import requests
 from unittest.mock import Mock, patch
-from label_studio_processor.client import LabelStudioClient, AuthenticationError
+from label_studio_processor.client import LabelStudioClient, AuthenticationError, iter_json_array
+from label_studio_processor.cache import get_cached_export, put_cached_export, iter_cached_export, cache_export_stream
 
 class TestLabelStudioClient:
     @pytest.fixture
@@ -46,6 +49,81 @@ class TestLabelStudioClient:
         assert annotations == mock_annotations
         mock_project.get_annotations.assert_called_once()
 
+    def test_iter_json_array(self):
+        # Setup: split mid-item, mid-number and inside a multi-byte character
+        body = '[{"id": 1, "name": "caf\u00e9"}, 12345, {"id": 2}]'.encode('utf-8')
+        chunks = [body[:24], body[24:32], body[32:]]
+
+        # Execute
+        items = list(iter_json_array(chunks))
+
+        # Assert
+        assert items == [{'id': 1, 'name': 'caf\u00e9'}, 12345, {'id': 2}]
+
+    def test_iter_json_array_truncated(self):
+        with pytest.raises(ValueError, match="Truncated JSON array"):
+            list(iter_json_array([b'[{"id": 1}, {"id"']))
+
+    def test_export_cache_key(self, tmp_path):
+        # Setup
+        updated_at = '2024-01-01T00:00:00Z'
+        key = {'url': 'http://a:8080', 'total_annotations_number': 3}
+        put_cached_export(1, updated_at, [{'id': 1}], cache_dir=str(tmp_path), key=key)
+
+        # Execute / Assert: same timestamp, but other counters or another server
+        assert get_cached_export(1, updated_at, cache_dir=str(tmp_path), key=key) == [{'id': 1}]
+        assert get_cached_export(1, updated_at, cache_dir=str(tmp_path),
+                                 key=dict(key, total_annotations_number=4)) is None
+        assert get_cached_export(1, updated_at, cache_dir=str(tmp_path), key=dict(key, url='http://b:8080')) is None
+
+    def test_cache_export_stream_commits(self, tmp_path):
+        # Setup
+        updated_at = '2024-01-01T00:00:00Z'
+        tasks = [{'id': i, 'data': {'text': 'caf\u00e9 \u2713' * i}} for i in range(20)]
+        body = json.dumps(tasks, ensure_ascii=False).encode('utf-8')
+        chunks = [body[i:i + 10] for i in range(0, len(body), 10)]
+
+        # Execute
+        passed = b''.join(cache_export_stream(1, updated_at, iter(chunks), cache_dir=str(tmp_path)))
+
+        # Assert: chunks pass through unchanged and the entry streams back from disk
+        assert passed == body
+        assert get_cached_export(1, updated_at, cache_dir=str(tmp_path)) == tasks
+        cached = iter_cached_export(1, updated_at, cache_dir=str(tmp_path), chunk_size=7)
+        assert list(iter_json_array(cached)) == tasks
+        put_cached_export(2, updated_at, tasks, cache_dir=str(tmp_path))
+        assert list(iter_json_array(iter_cached_export(2, updated_at, cache_dir=str(tmp_path), chunk_size=7))) == tasks
+        assert iter_cached_export(3, updated_at, cache_dir=str(tmp_path)) is None
+
+    def test_cache_export_stream_abort(self, tmp_path):
+        # Setup
+        def failing_chunks():
+            yield b'[{"id": 1}, '
+            raise requests.ConnectionError("connection reset")
+
+        # Execute: one stream abandoned by the reader, one failing mid-body
+        stream = cache_export_stream(1, '2024-01-01T00:00:00Z', iter([b'[{"id": 1}, ', b'{"id": 2}]']),
+                                     cache_dir=str(tmp_path))
+        next(stream)
+        stream.close()
+        with pytest.raises(requests.ConnectionError):
+            list(cache_export_stream(1, '2024-01-01T00:00:00Z', failing_chunks(), cache_dir=str(tmp_path)))
+
+        # Assert: nothing is committed and no temp files are left behind
+        assert os.listdir(tmp_path) == []
+
+    def test_put_cached_export_prunes_old_snapshots(self, tmp_path):
+        # Setup
+        put_cached_export(1, '2024-01-01T00:00:00Z', [{'id': 1}], cache_dir=str(tmp_path))
+        put_cached_export(2, '2024-01-01T00:00:00Z', [{'id': 2}], cache_dir=str(tmp_path))
+
+        # Execute
+        path = put_cached_export(1, '2024-01-02T00:00:00Z', [{'id': 1}, {'id': 3}], cache_dir=str(tmp_path))
+
+        # Assert: only the latest snapshot per project, and no temp files left behind
+        assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), '2-2024-01-01T00-00-00Z.json.gz'])
+        assert get_cached_export(1, '2024-01-01T00:00:00Z', cache_dir=str(tmp_path)) is None
+
     def test_init_requires_api_key(self):
         with pytest.raises(ValueError, match="API key is required"):
             LabelStudioClient(url='http://example.com')
@@ -54,22 +132,21 @@ class TestLabelStudioClient:
         # Setup
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_requests.get.return_value = mock_response
+        mock_requests.Session.return_value.get.return_value = mock_response
         
         # Execute
         client = LabelStudioClient(url='http://example.com', api_key='test-key')
         
         # Assert
-        mock_requests.get.assert_called_once_with(
-            'http://example.com/api/projects/',
-            headers={'Authorization': 'Token test-key'}
-        )
+        session = mock_requests.Session.return_value
+        session.headers.__setitem__.assert_called_once_with('Authorization', 'Token test-key')
+        session.get.assert_called_once_with('http://example.com/api/projects/')
     
     def test_verify_connection_auth_error(self, mock_requests, mock_client):
         # Setup
         mock_response = Mock()
         mock_response.status_code = 401
-        mock_requests.get.return_value = mock_response
+        mock_requests.Session.return_value.get.return_value = mock_response
         mock_requests.exceptions.RequestException = requests.exceptions.RequestException
         
         # Execute & Assert
@@ -84,7 +161,7 @@ class TestLabelStudioClient:
             {'id': 1, 'title': 'Project 1'},
             {'id': 2, 'title': 'Project 2'}
         ]
-        mock_requests.get.return_value = mock_response
+        mock_requests.Session.return_value.get.return_value = mock_response
         
         # Execute
         client = LabelStudioClient(url='http://example.com', api_key='test-key')
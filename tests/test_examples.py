@@ -0,0 +1,29 @@
+import numpy as np
+from PIL import Image
+from label_studio_sdk.converter.brush import mask2rle
+from label_studio_processor.utils import prepare_training_data
+from label_studio_processor.examples.prepare_training_data import save_task
+
+class TestPrepareTrainingDataExample:
+    def test_save_task_packed_mask_width_differs_from_image(self, tmp_path, sample_mask):
+        # Setup: a 10 px wide mask annotated on an image file that is 20 px wide
+        images_dir = tmp_path / "images"
+        images_dir.mkdir()
+        Image.new('RGB', (20, 10)).save(images_dir / "img.png")
+        height, width = sample_mask.shape
+        task = {'id': 1, 'file_upload': 'img.png', 'annotations': [{'result': [{
+            'type': 'brushlabels',
+            'value': {'rle': mask2rle((sample_mask * 255).astype(np.uint8)), 'brushlabels': ['cell']},
+            'original_width': width, 'original_height': height
+        }]}]}
+        for name in ("out_images", "masks", "boxes"):
+            (tmp_path / name).mkdir()
+        data = prepare_training_data([task], str(images_dir), keep_images=False, pack_masks=True)
+
+        # Execute
+        save_task('1', data['images']['1'], data['masks']['1'], data['box_prompts']['1'], data['class_ids']['1'],
+                  str(tmp_path / "out_images"), str(tmp_path / "masks"), str(tmp_path / "boxes"))
+
+        # Assert
+        np.testing.assert_array_equal(np.asarray(Image.open(tmp_path / "masks" / "1_0.png")), sample_mask)
+        assert Image.open(tmp_path / "out_images" / "1.png").size == (20, 10)
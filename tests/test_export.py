@@ -0,0 +1,153 @@
+import os
+import json
+import pytest
+import numpy as np
+from unittest.mock import patch
+from PIL import Image
+from label_studio_sdk.converter.brush import mask2rle
+from label_studio_processor import export
+from label_studio_processor.export import (
+    LINK_MODES, stage_image, _is_staged, _reflink, export_to_yolo, split_labels
+)
+
+@pytest.fixture
+def exported_data_dir(tmp_path):
+    # Five tasks, each with two brush masks and a rectangle, laid out like export_project_data
+    root = tmp_path / "export"
+    (root / "images").mkdir(parents=True)
+    (root / "annotations").mkdir()
+    mapping = {}
+    for task_id in range(1, 6):
+        width, height = 40 + task_id, 30
+        image_file = f"task_{task_id}_img{task_id}.png"
+        Image.new('RGB', (width, height)).save(root / "images" / image_file)
+        results = []
+        for k, label in enumerate(('cell', 'nucleus')):
+            mask = np.zeros((height, width), dtype=np.uint8)
+            mask[2 + k:10 + task_id, 3:12 + k] = 255
+            results.append({'type': 'brushlabels', 'original_width': width, 'original_height': height,
+                            'value': {'rle': mask2rle(mask), 'brushlabels': [label]}})
+        results.append({'type': 'rectanglelabels', 'original_width': width, 'original_height': height,
+                        'value': {'x': 10, 'y': 20, 'width': 30, 'height': 25, 'rectanglelabels': ['box']}})
+        annotation_file = f"task_{task_id}_annotation.json"
+        task = {'id': task_id, 'annotations': [{'id': task_id, 'result': results}]}
+        (root / "annotations" / annotation_file).write_text(json.dumps(task))
+        mapping[str(task_id)] = {'image_file': image_file, 'annotation_file': annotation_file}
+    (root / "image_annotation_pairs.json").write_text(json.dumps(mapping))
+    return str(root)
+
+class TestExport:
+    @pytest.mark.parametrize("link_mode", LINK_MODES)
+    def test_stage_image(self, tmp_path, link_mode):
+        # Setup
+        src = tmp_path / "src.png"
+        src.write_bytes(b"image data")
+        dst = tmp_path / "dst.png"
+
+        # Execute
+        stage_image(str(src), str(dst), link_mode)
+
+        # Assert
+        assert dst.read_bytes() == b"image data"
+        assert os.path.islink(dst) == (link_mode == 'symlink')
+        assert os.path.samefile(src, dst) == (link_mode != 'copy')
+        assert _is_staged(str(src), str(dst))
+
+    @pytest.mark.parametrize("link_mode", LINK_MODES)
+    def test_stage_image_rerun_keeps_target(self, tmp_path, link_mode):
+        # Setup
+        src = tmp_path / "src.png"
+        src.write_bytes(b"image data")
+        dst = tmp_path / "dst.png"
+        stage_image(str(src), str(dst), link_mode)
+        before = os.lstat(dst)
+
+        # Execute
+        stage_image(str(src), str(dst), link_mode)
+
+        # Assert: the same file is left in place
+        after = os.lstat(dst)
+        assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+    @pytest.mark.parametrize("link_mode", LINK_MODES)
+    def test_stage_image_replaces_stale_target(self, tmp_path, link_mode):
+        # Setup: an outdated file and a dangling symlink from a previous run
+        src = tmp_path / "src.png"
+        src.write_bytes(b"new image data")
+        stale = tmp_path / "stale.png"
+        stale.write_bytes(b"old data")
+        dangling = tmp_path / "dangling.png"
+        os.symlink(tmp_path / "missing.png", dangling)
+        assert not _is_staged(str(src), str(stale))
+        assert not _is_staged(str(src), str(dangling))
+
+        # Execute
+        stage_image(str(src), str(stale), link_mode)
+        stage_image(str(src), str(dangling), link_mode)
+
+        # Assert
+        assert stale.read_bytes() == b"new image data"
+        assert dangling.read_bytes() == b"new image data"
+
+    def test_stage_image_dedupes_copies(self, tmp_path):
+        # Setup: two identical sources and one of the same size but other content
+        for name, data in (("a.png", b"same data"), ("b.png", b"same data"), ("c.png", b"diff data")):
+            (tmp_path / name).write_bytes(data)
+        out = tmp_path / "out"
+        out.mkdir()
+        seen = {}
+
+        # Execute
+        for name in ("a.png", "b.png", "c.png"):
+            stage_image(str(tmp_path / name), str(out / name), 'copy', seen=seen)
+
+        # Assert: the duplicate is a hardlink to the first copy, not to its source
+        assert os.path.samefile(out / "a.png", out / "b.png")
+        assert not os.path.samefile(out / "a.png", tmp_path / "a.png")
+        assert not os.path.samefile(out / "a.png", out / "c.png")
+        assert (out / "c.png").read_bytes() == b"diff data"
+        assert len(seen) == 2
+
+    @pytest.mark.skipif(export.fcntl is None, reason="reflinks need fcntl")
+    def test_reflink_falls_back_to_copy(self, tmp_path):
+        # Setup
+        src = tmp_path / "src.png"
+        src.write_bytes(b"image data")
+        dst = tmp_path / "dst.png"
+
+        # Execute
+        with patch.object(export.fcntl, 'ioctl', side_effect=OSError("not supported")) as mock_ioctl:
+            cloned = _reflink(str(src), str(dst))
+            left_behind = dst.exists()
+            stage_image(str(src), str(dst), 'copy')
+
+        # Assert: the failed clone leaves nothing behind and a plain copy is made
+        assert not cloned
+        assert not left_behind
+        assert mock_ioctl.call_count == 2
+        assert dst.read_bytes() == b"image data"
+        assert not os.path.islink(dst)
+        assert not os.path.samefile(src, dst)
+
+    def test_split_labels_matches_txt_export(self, tmp_path, exported_data_dir):
+        # Setup
+        txt_dir = tmp_path / "yolo_txt"
+        jsonl_dir = tmp_path / "yolo_jsonl"
+        assert export_to_yolo(exported_data_dir, str(txt_dir)) == 5
+        assert export_to_yolo(exported_data_dir, str(jsonl_dir), label_format='jsonl') == 5
+
+        # Execute
+        count = split_labels(str(jsonl_dir / "labels.jsonl"), str(tmp_path / "split"))
+
+        # Assert
+        expected = sorted(os.listdir(txt_dir / "labels"))
+        assert count == 5
+        assert os.listdir(jsonl_dir / "labels") == []
+        assert sorted(os.listdir(tmp_path / "split")) == expected
+        for name in expected:
+            assert (txt_dir / "labels" / name).read_bytes()
+            assert (tmp_path / "split" / name).read_bytes() == (txt_dir / "labels" / name).read_bytes()
+
+    def test_stage_image_invalid_mode(self, tmp_path):
+        with pytest.raises(ValueError, match="Invalid link mode"):
+            stage_image(str(tmp_path / "src.png"), str(tmp_path / "dst.png"), 'move')
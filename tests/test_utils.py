@@ -1,7 +1,13 @@
 import pytest
 import numpy as np
 from unittest.mock import patch, Mock
-from label_studio_processor.utils import mask_to_bbox, download_image
+from PIL import Image
+from label_studio_sdk.converter.brush import mask2rle, decode_rle as sdk_decode_rle
+from label_studio_processor.utils import (
+    mask_to_bbox, masks_to_bboxes, download_image, download_images, get_image_size, bbox_to_yolo, bbox_to_yolo_batch, rle_to_bbox,
+    decode_rle, decode_mask, write_yolo_labels, pack_mask, unpack_mask, parse_annotation, prepare_training_data
+)
+from label_studio_processor.data import get_dataset_statistics
 
 class TestUtils:
     def test_mask_to_bbox(self, sample_mask):
@@ -10,12 +16,218 @@ class TestUtils:
 
         # Assert
         assert bbox == (3, 2, 6, 7)  # These values correspond to the sample mask
+        assert mask_to_bbox(sample_mask.astype(np.uint8)) == bbox
 
-    @patch('label_studio_processor.utils.requests.get')
-    def test_download_image(self, mock_get, sample_image):
+    def test_mask_to_bbox_empty_mask(self):
+        # Execute / Assert
+        assert mask_to_bbox(np.zeros((4, 5), dtype=np.uint8)) is None
+
+    def test_masks_to_bboxes(self, sample_mask):
+        # Setup
+        corner = np.zeros_like(sample_mask)
+        corner[-1, -1] = 1
+        masks = np.stack([sample_mask, np.zeros_like(sample_mask), corner])
+
+        # Execute
+        bboxes = masks_to_bboxes(masks)
+
+        # Assert
+        assert bboxes == [mask_to_bbox(sample_mask), None, mask_to_bbox(corner)]
+
+    def test_pack_mask_roundtrip(self, sample_mask):
+        # Setup: width that is not a multiple of 8
+        mask = sample_mask[:, :7]
+
+        # Execute
+        packed = pack_mask(mask)
+
+        # Assert
+        assert packed.shape == (10, 1)
+        np.testing.assert_array_equal(unpack_mask(packed, 7), mask)
+
+    def test_packed_mask_width_differs_from_image(self, tmp_path, sample_mask):
+        # Setup: a 10 px wide mask annotated on an image file that is 20 px wide
+        Image.new('RGB', (20, 10)).save(tmp_path / "img.png")
+        height, width = sample_mask.shape
+        task = {'id': 1, 'file_upload': 'img.png', 'annotations': [{'result': [{
+            'type': 'brushlabels',
+            'value': {'rle': mask2rle((sample_mask * 255).astype(np.uint8)), 'brushlabels': ['cell']},
+            'original_width': width, 'original_height': height
+        }]}]}
+
+        # Execute
+        data = prepare_training_data([task], str(tmp_path), keep_images=False, pack_masks=True)
+
+        # Assert
+        packed, mask_width = data['masks']['1'][0]
+        assert mask_width == width
+        np.testing.assert_array_equal(unpack_mask(packed, mask_width), sample_mask)
+
+    def test_dataset_statistics_packed_masks(self, tmp_path, sample_mask):
+        # Setup: a 12 px wide mask, so packed rows carry padding bits
+        Image.new('RGB', (12, 10)).save(tmp_path / "img.png")
+        mask = np.zeros((10, 12), dtype=bool)
+        mask[:, 2:] = sample_mask
+        task = {'id': 1, 'file_upload': 'img.png', 'annotations': [{'result': [{
+            'type': 'brushlabels',
+            'value': {'rle': mask2rle((mask * 255).astype(np.uint8)), 'brushlabels': ['cell']},
+            'original_width': 12, 'original_height': 10
+        }]}]}
+
+        # Execute
+        packed = get_dataset_statistics(prepare_training_data([task], str(tmp_path), keep_images=False, pack_masks=True))
+        unpacked = get_dataset_statistics(prepare_training_data([task], str(tmp_path), keep_images=False))
+        areas = get_dataset_statistics(prepare_training_data([task], str(tmp_path), keep_images=False, keep_masks=False))
+
+        # Assert
+        assert packed == unpacked == areas
+        assert packed['avg_mask_area'] == sample_mask.sum()
+
+    def test_prepare_training_data_nested_image(self, tmp_path, sample_mask):
+        # Setup: one image in a subdirectory of images_dir, one missing
+        (tmp_path / "sub").mkdir()
+        Image.new('RGB', (10, 10)).save(tmp_path / "sub" / "img.png")
+        result = {'type': 'brushlabels', 'original_width': 10, 'original_height': 10,
+                  'value': {'rle': mask2rle((sample_mask * 255).astype(np.uint8)), 'brushlabels': ['cell']}}
+        tasks = [{'id': task_id, 'file_upload': file_upload, 'annotations': [{'result': [result]}]}
+                 for task_id, file_upload in ((1, 'sub/img.png'), (2, 'sub/missing.png'))]
+
+        # Execute
+        data = prepare_training_data(tasks, str(tmp_path), keep_images=False)
+
+        # Assert
+        assert data['task_ids'] == ['1']
+        assert data['images']['1'] == str(tmp_path / "sub" / "img.png")
+
+    def test_decode_rle_matches_sdk(self):
+        # Setup: noisy mask so the RLE contains both repeated and literal runs
+        rng = np.random.default_rng(0)
+        mask = (rng.random((12, 17)) < 0.3).astype(np.uint8) * 255
+        mask[3:9, 4:15] = 128
+        rle = mask2rle(mask)
+
+        # Execute
+        result = decode_rle(rle, 17, 12)
+
+        # Assert
+        expected = sdk_decode_rle(rle).reshape(12, 17, 4)[:, :, 3]
+        np.testing.assert_array_equal(result, expected)
+        np.testing.assert_array_equal(decode_rle(rle, 17, 12, binary=True), (expected > 0).astype(np.uint8))
+
+    def test_decode_mask_reuses_identical_rle(self, sample_mask):
+        # Setup: two results carrying the same RLE
+        height, width = sample_mask.shape
+        rle = mask2rle((sample_mask * 255).astype(np.uint8))
+        result = {'type': 'brushlabels', 'value': {'rle': rle, 'brushlabels': ['cell']},
+                  'original_width': width, 'original_height': height}
+        cache = {}
+
+        # Execute
+        first = decode_mask(result, cache)
+        second = decode_mask(dict(result, value={'rle': list(rle), 'brushlabels': ['cell']}), cache)
+        uncached = decode_mask(result)
+
+        # Assert: shared read-only masks only within a cache
+        np.testing.assert_array_equal(first, sample_mask)
+        assert second is first
+        assert not first.flags.writeable
+        np.testing.assert_array_equal(uncached, sample_mask)
+        assert uncached is not first
+        assert uncached.flags.writeable
+
+    def test_parse_annotation_min_area(self, sample_mask):
+        # Setup: a 24 pixel mask and a 1 pixel mask
+        height, width = sample_mask.shape
+        dot = np.zeros_like(sample_mask)
+        dot[0, 0] = True
+        annotation = {'result': [
+            {'type': 'brushlabels', 'value': {'rle': mask2rle((mask * 255).astype(np.uint8)), 'brushlabels': ['cell']},
+             'original_width': width, 'original_height': height}
+            for mask in (sample_mask, dot)
+        ]}
+
+        # Execute
+        masks, bboxes, class_ids, status = parse_annotation(annotation, {'cell': 0}, min_area=2)
+
+        # Assert
+        assert len(masks) == 1
+        assert bboxes == [(3, 2, 6, 7)]
+        assert class_ids == [0]
+        assert len(parse_annotation(annotation, {'cell': 0})[0]) == 2
+
+    def test_rle_to_bbox(self, sample_mask):
+        # Setup
+        rle = mask2rle((sample_mask * 255).astype(np.uint8))
+        height, width = sample_mask.shape
+
+        # Execute
+        bbox = rle_to_bbox(rle, width, height)
+
+        # Assert
+        assert bbox == mask_to_bbox(sample_mask)
+
+    def test_rle_to_bbox_empty_mask(self):
+        # Setup
+        rle = mask2rle(np.zeros((4, 5), dtype=np.uint8))
+
+        # Execute / Assert
+        assert rle_to_bbox(rle, 5, 4) is None
+
+    def test_bbox_to_yolo_batch(self):
+        # Setup
+        bboxes = [(3, 2, 6, 7), (0, 0, 10, 20), (5, 5, 5, 5)]
+
+        # Execute
+        result = bbox_to_yolo_batch(bboxes, 40, 30)
+
+        # Assert
+        expected = [bbox_to_yolo(bbox, 40, 30) for bbox in bboxes]
+        np.testing.assert_allclose(result, expected)
+
+    def test_bbox_to_yolo_batch_per_box_sizes(self):
+        # Setup: boxes from images of different sizes
+        bboxes = [(3, 2, 6, 7), (0, 0, 10, 20)]
+        widths, heights = [40, 64], [30, 48]
+
+        # Execute
+        result = bbox_to_yolo_batch(bboxes, widths, heights)
+
+        # Assert
+        expected = [bbox_to_yolo(bbox, w, h) for bbox, w, h in zip(bboxes, widths, heights)]
+        np.testing.assert_allclose(result, expected)
+
+    def test_write_yolo_labels(self, tmp_path):
+        # Setup
+        label_path = tmp_path / "labels.txt"
+        yolo_boxes = bbox_to_yolo_batch([(3, 2, 6, 7), (0, 0, 10, 20)], 40, 30)
+
+        # Execute
+        write_yolo_labels(str(label_path), [2, 0], yolo_boxes)
+
+        # Assert
+        assert label_path.read_text().splitlines() == [
+            "2 0.112500 0.150000 0.075000 0.166667",
+            "0 0.125000 0.333333 0.250000 0.666667",
+        ]
+
+    @pytest.mark.parametrize('fmt', ['PNG', 'JPEG', 'GIF', 'BMP'])
+    def test_get_image_size(self, tmp_path, fmt):
+        # Setup
+        image_path = tmp_path / f"image.{fmt.lower()}"
+        Image.new('RGB', (123, 45)).save(image_path, fmt)
+
+        # Execute
+        size = get_image_size(str(image_path))
+
+        # Assert
+        assert tuple(size) == (123, 45)
+
+    @patch('label_studio_processor.utils._download_session')
+    def test_download_image(self, mock_session, sample_image):
         # Setup
         mock_response = Mock()
         mock_response.content = sample_image.tobytes()
+        mock_get = mock_session.return_value.get
         mock_get.return_value = mock_response
 
         # Execute
@@ -25,4 +237,16 @@ class TestUtils:
 
         # Assert
         assert result == sample_image
-        mock_get.assert_called_once_with('http://example.com/image.jpg') 
\ No newline at end of file
+        mock_get.assert_called_once_with('http://example.com/image.jpg')
+
+    @patch('label_studio_processor.utils.download_image')
+    def test_download_images_keeps_order(self, mock_download):
+        # Setup
+        urls = [f'http://example.com/{i}.png' for i in range(20)]
+        mock_download.side_effect = lambda url: url.rsplit('/', 1)[1]
+
+        # Execute
+        result = download_images(urls, max_workers=4)
+
+        # Assert
+        assert result == [f'{i}.png' for i in range(20)] 
\ No newline at end of file